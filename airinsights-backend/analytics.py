@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterable, List
+import os
+from aviation import PAGE_SIZE, flight_cache, get_cached_flight_entry, iter_flight_pages
+from metrics import timed
+from time_buckets import HOURS_PER_WEEK, HourlyHistogram, departure_slot
+from utils import airport_country, airport_short_name, airport_timezone
+
+MEMO_SIZE = 8
+ANALYTICS_FLIGHT_LIMIT = int(os.getenv("ANALYTICS_FLIGHT_LIMIT", "100"))
+
+
+class FlightAggregates:
+    """
+    Every aggregate used by the dashboard, analytics and trends endpoints,
+    computed in a single pass over a flight batch. Flights can be added in
+    chunks, so paged fetches can stream straight into it.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.active = 0
+        self.scheduled = 0
+        self.statuses = Counter()
+        self.origin_airports = Counter()
+        self.dest_airports = Counter()
+        self.origin_countries = Counter()
+        self.dest_countries = Counter()
+        # Route, airline and raw airport counts only cover flights with both airports known
+        self.routes = Counter()
+        self.route_airlines = defaultdict(set)
+        self.airlines = Counter()
+        self.departure_airports = Counter()
+        self.arrival_airports = Counter()
+        # Departures by local hour (and weekday) at the departure airport
+        self.departures = HourlyHistogram(by_weekday=True)
+        # Raw AviationStack airport name -> short display name
+        self.airport_short_names = {}
+        # Cache entry the flights came from, set by get_flight_aggregates
+        self.version = 0
+        self.fetched_at = time.time()
+
+    def add(self, flight: Dict) -> None:
+        self.total += 1
+
+        dep_airport = flight.get("departure_airport") or "Unknown"
+        arr_airport = flight.get("arrival_airport") or "Unknown"
+        dep_codes = (flight.get("departure_iata"), flight.get("departure_icao"))
+        arr_codes = (flight.get("arrival_iata"), flight.get("arrival_icao"))
+        dep_short = airport_short_name(dep_airport, *dep_codes)
+        arr_short = airport_short_name(arr_airport, *arr_codes)
+        self.airport_short_names[dep_airport] = dep_short
+        self.airport_short_names[arr_airport] = arr_short
+
+        self.origin_airports[dep_short] += 1
+        self.dest_airports[arr_short] += 1
+        self.origin_countries[airport_country(*dep_codes, fallback=flight.get("departure_country"))] += 1
+        self.dest_countries[airport_country(*arr_codes, fallback=flight.get("arrival_country"))] += 1
+
+        self.statuses[flight.get("status") or "unknown"] += 1
+        if flight.get("status") == "active":
+            self.active += 1
+        else:
+            self.scheduled += 1
+
+        if flight.get("departure_airport") and flight.get("arrival_airport"):
+            route = f"{dep_short} → {arr_short}"
+            airline = flight.get("airline") or "Unknown"
+            self.routes[route] += 1
+            self.route_airlines[route].add(airline)
+            self.airlines[airline] += 1
+            self.departure_airports[dep_airport] += 1
+            self.arrival_airports[arr_airport] += 1
+
+        # Rows can come from clients (/insights), so only a valid slot is trusted
+        slot = flight.get("departure_slot")
+        if type(slot) is not int or not 0 <= slot < HOURS_PER_WEEK:
+            slot = departure_slot(flight.get("departure_time"),
+                                  airport_timezone(*dep_codes, fallback=flight.get("departure_timezone")))
+        if slot is not None:
+            self.departures.add(slot)
+
+    def add_batch(self, flights: Iterable[Dict]) -> "FlightAggregates":
+        for flight in flights:
+            self.add(flight)
+        return self
+
+    def add_pages(self, pages: Iterable[List[Dict]]) -> "FlightAggregates":
+        for page in pages:
+            self.add_batch(page)
+        return self
+
+    @property
+    def all_airports(self) -> Counter:
+        return self.departure_airports + self.arrival_airports
+
+
+_memo_lock = threading.Lock()
+_memo: "OrderedDict[int, tuple]" = OrderedDict()
+
+def aggregate_flights(flights: List[Dict]) -> FlightAggregates:
+    """
+    Aggregates for a flight batch, memoized per batch object.
+
+    Cached AviationStack responses are shared list objects, so every endpoint
+    reading the same cached snapshot reuses one computation.
+    """
+    key = id(flights)
+    with _memo_lock:
+        hit = _memo.get(key)
+        # The batch is held in the memo entry, so its id cannot be reused while cached
+        if hit is not None and hit[0] is flights:
+            _memo.move_to_end(key)
+            return hit[1]
+
+    with timed("aggregate"):
+        aggregates = FlightAggregates().add_batch(flights)
+
+    with _memo_lock:
+        _memo[key] = (flights, aggregates)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return aggregates
+
+def get_flight_aggregates(limit=ANALYTICS_FLIGHT_LIMIT):
+    """
+    Main function to get aggregates over the latest AviationStack flights.
+
+    Up to one page comes from the shared flight cache. Larger limits walk
+    AviationStack's pagination and stream each page into the aggregator, so
+    only the aggregates (not the flights) are cached.
+
+    ``version`` and ``fetched_at`` identify the underlying cache entry, so
+    responses built from the same aggregates can share an ETag.
+    """
+    if limit <= PAGE_SIZE:
+        entry = get_cached_flight_entry(limit=limit)
+        aggregates = aggregate_flights(entry.value)
+    else:
+        entry = flight_cache.get_entry(("aggregates", limit), lambda: FlightAggregates().add_pages(iter_flight_pages(limit)))
+        aggregates = entry.value
+    aggregates.version = entry.version
+    aggregates.fetched_at = entry.fetched_at
+    return aggregates
@@ -1,28 +1,63 @@
-from flask import Flask, jsonify, request
+import math
+import time
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-from aviation import get_flight_data
-from flight_scraper import get_scraped_flights
-from gemini import analyze_with_gemini
-from routes.filtered_flights import filter_bp
+from aviation import get_cached_flight_data
+from circuit_breaker import CircuitOpenError
+from live_traffic import (
+    LIVE_KEEPALIVE, LIVE_MAX_DURATION, LiveSubscription, get_traffic_snapshot, live_stream_slots, traffic_poller
+)
+from gemini import analyze_with_gemini, analyze_with_gemini_async, stream_with_gemini
+from http_client import ASYNC_UPSTREAM, upstream
+from http_cache import conditional_json_response
+from json_backend import FastJSONProvider, dumps
+from llm_client import LLMBusyError
+from metrics import METRICS_ENABLED, REQUEST_SECONDS, render_metrics
+from routes.filtered_flights import filter_bp, validate_filter_params, validate_spatial_params
 from routes.flight_analytics import analytics_bp
+from time_buckets import slot_label
 from datetime import datetime
-from utils import clean_airport_name
+from analytics import get_flight_aggregates
 
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 app.register_blueprint(filter_bp)
 app.register_blueprint(analytics_bp)
 
+if METRICS_ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request_time(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            # Route template rather than path, so the label set stays bounded
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint, str(response.status_code))
+        return response
+
 @app.route("/", methods=["GET"])
 def index():
     return jsonify({"message": "Welcome to the AirInsights API!"})
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus scrape endpoint; 404 unless METRICS_ENABLED is set
+    """
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/flights", methods=["GET"])
 def fetch_aviationstack():
     try:
-        raw_data = get_flight_data(limit=50)
+        raw_data = get_cached_flight_data(limit=50)
         if not raw_data:
             return jsonify({"error": "No flight data available"}), 500
         
@@ -34,14 +69,22 @@ def fetch_aviationstack():
 @app.route("/scraped", methods=["GET"])
 def fetch_real_time_flights():
     try:
+        errors = []
+        spatial_query = validate_spatial_params(request.args, errors)
+        if errors:
+            return jsonify({"error": "Validation errors", "details": errors}), 400
 
-        traffic = get_scraped_flights()
-        if not traffic:
+        snapshot = get_traffic_snapshot()
+        if not len(snapshot.table):
             return jsonify({
                 "error": "No real-time flight data available from FlightRadar24 or OpenSky APIs",
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             }), 503
-        return jsonify(traffic)
+        return conditional_json_response(
+            ("scraped", spatial_query),
+            (snapshot.version, snapshot.timestamp),
+            lambda: snapshot.select(spatial_query).to_rows()
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -51,166 +94,195 @@ def generate_insights():
         json_data = request.get_json()
         if not json_data:
             return jsonify({"error": "Missing data"}), 400
-        insights = analyze_with_gemini(json_data)
+        if ASYNC_UPSTREAM:
+            insights = upstream.run(analyze_with_gemini_async(json_data))
+        else:
+            insights = analyze_with_gemini(json_data)
         return jsonify({"insights": insights})
+    except LLMBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+@app.route("/insights/stream", methods=["POST"])
+def stream_insights():
+    """
+    Same as /insights, but streams the text as server-sent events:
+    'chunk' events carry text fragments, then a final 'done' (or 'error') event.
+    """
+    json_data = request.get_json(silent=True)
+    if not json_data:
+        return jsonify({"error": "Missing data"}), 400
+
+    def generate():
+        chunks = stream_with_gemini(json_data)
+        try:
+            for text in chunks:
+                yield sse_event("chunk", {"text": text})
+            yield sse_event("done", {})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            # Runs on client disconnect too, which stops the upstream generation
+            chunks.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/flights/live", methods=["GET"])
+def stream_live_traffic():
+    """
+    Push live traffic as server-sent events. Accepts the viewport (bounds or
+    lat/lon + radius_km) and attribute filters of /flights/filter.
+    A 'full' event carries every matching aircraft, then each new snapshot
+    sends a 'delta' event with only the added, updated and removed aircraft.
+    A fresh 'full' event is sent if the client falls behind by more than one snapshot.
+    At most LIVE_MAX_STREAMS streams are open per worker (503 beyond that), and each
+    ends after LIVE_STREAM_MAX_DURATION seconds, after which EventSource reconnects.
+    """
+    errors = []
+    spatial_query = validate_spatial_params(request.args, errors)
+    flight_filter = validate_filter_params(request.args, errors)
+    if spatial_query and spatial_query.nearest is not None:
+        errors.append("nearest is not supported for live streams, use bounds or radius_km")
+    if errors:
+        return jsonify({"error": "Validation errors", "details": errors}), 400
+
+    if not live_stream_slots.acquire(blocking=False):
+        return jsonify({"error": "Too many live streams, try again shortly"}), 503, {"Retry-After": "30"}
+
+    subscription = LiveSubscription(spatial_query, flight_filter)
+
+    def generate():
+        yield sse_event("full", subscription.full(get_traffic_snapshot()))
+        last_sent = started = time.monotonic()
+        while time.monotonic() - started < LIVE_MAX_DURATION:
+            snapshot = traffic_poller.wait_for_update(subscription.version, LIVE_KEEPALIVE)
+            event = None
+            if snapshot.version == subscription.version + 1:
+                delta = subscription.delta(snapshot)
+                if delta is not None:
+                    event = sse_event("delta", delta)
+            elif snapshot.version > subscription.version:
+                event = sse_event("full", subscription.full(snapshot))
+
+            if event is not None:
+                yield event
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= LIVE_KEEPALIVE:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(live_stream_slots.release)
+    return response
+
 @app.route("/flights/dashboard", methods=["GET"])
 def get_dashboard_data():
     try:
 
         try:
-            aviation_flights = get_flight_data(limit=100)
+            aggregates = get_flight_aggregates()
         except Exception as api_error:
+            headers = {}
+            if isinstance(api_error, CircuitOpenError):
+                headers["Retry-After"] = str(math.ceil(api_error.retry_after))
             return jsonify({
                 "error": f"Failed to fetch data from AviationStack API: {str(api_error)}",
                 "timestamp": datetime.utcnow().isoformat() + "Z"
-            }), 503
+            }), 503, headers
         
 
-        if not aviation_flights or not isinstance(aviation_flights, list):
+        if not aggregates.total:
             return jsonify({
                 "error": "No real-time flight data available from AviationStack API",
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             }), 503
         
 
-        origin_airports = []
-        dest_airports = []
-        scheduled = 0
-        active = 0
-
-
-
-        for flight in aviation_flights:
-    
-            dep_airport = flight.get("departure_airport") or "Unknown"
-            arr_airport = flight.get("arrival_airport") or "Unknown"
-            
-            origin_airports.append(clean_airport_name(dep_airport))
-            dest_airports.append(clean_airport_name(arr_airport))
-            
-    
-            status = flight.get("status") or "scheduled"
-            if status == "active":
-                active += 1
-            else:
-                scheduled += 1
-
-        from collections import Counter
-        
-        flight_overview = {
-            "airports": {
-                "origin": [{"name": airport, "value": count} for airport, count in Counter(origin_airports).most_common(5)] if origin_airports else [],
-                "destination": [{"name": airport, "value": count} for airport, count in Counter(dest_airports).most_common(5)] if dest_airports else []
-            },
-            "status": [
-                {"name": "Active", "value": active},
-                {"name": "Scheduled", "value": scheduled}
-            ]
-        }
-        
-
-        routes = []
-        airlines = []
-        departure_airports = []
-        arrival_airports = []
-        
-        for flight in aviation_flights:
-            dep_airport = flight.get('departure_airport')
-            arr_airport = flight.get('arrival_airport')
-            
-            if dep_airport and arr_airport:
-        
-                dep_short = clean_airport_name(dep_airport)
-                arr_short = clean_airport_name(arr_airport)
-                route = f"{dep_short} → {arr_short}"
-                
-                routes.append(route)
-                airlines.append(flight.get('airline') or 'Unknown')
-                departure_airports.append(dep_airport)
-                arrival_airports.append(arr_airport)  
-        
-        route_counts = Counter(routes)
-        departure_counts = Counter(departure_airports)
-        arrival_counts = Counter(arrival_airports)
-        airline_counts = Counter(airlines)
-        
-        all_airports = departure_counts + arrival_counts
-        
-
-        time_distribution = {}
-        for flight in aviation_flights:
-            if flight.get('departure_time'):
-                try:
-            
-                    if isinstance(flight['departure_time'], str):
-                
-                        departure_dt = datetime.fromisoformat(flight['departure_time'].replace('Z', '+00:00'))
-                    else:
-                
-                        departure_dt = datetime.fromtimestamp(flight['departure_time'] / 1000)
-                    
-                    departure_hour = departure_dt.hour
-                    time_slot = f"{departure_hour:02d}:00-{(departure_hour+1):02d}:00"
-                    time_distribution[time_slot] = time_distribution.get(time_slot, 0) + 1
-                except Exception as e:
-                    print(f"Error processing departure time: {e}")
-                    continue
+        def build_dashboard():
+            flight_overview = {
+                "airports": {
+                    "origin": [{"name": airport, "value": count} for airport, count in aggregates.origin_airports.most_common(5)],
+                    "destination": [{"name": airport, "value": count} for airport, count in aggregates.dest_airports.most_common(5)]
+                },
+                "status": [
+                    {"name": "Active", "value": aggregates.active},
+                    {"name": "Scheduled", "value": aggregates.scheduled}
+                ]
+            }
         
 
-        peak_hours = sorted(time_distribution.items(), key=lambda x: x[1], reverse=True)[:8]
+            route_counts = aggregates.routes
+            departure_counts = aggregates.departure_airports
+            arrival_counts = aggregates.arrival_airports
+            all_airports = aggregates.all_airports
+            peak_hours = [(slot_label(hour), count) for hour, count in aggregates.departures.peak_hours(8)]
         
-        trend_analysis = {
-            "routes": {
-                "popular": [
-                    {
-                        "name": route,
-                        "frequency": count,
-                        "demand": "High" if count >= 5 else "Medium" if count >= 3 else "Low"
-                    }
-                    for route, count in route_counts.most_common(10)
-                ] if routes else []
-            },
-            "airports": {
-                "high_demand": [
-                    {
-                        "name": airport,
-                        "total_flights": count,
-                        "departures": departure_counts.get(airport, 0),
-                        "arrivals": arrival_counts.get(airport, 0)
-                    }
-                    for airport, count in all_airports.most_common(10)
-                ] if departure_airports or arrival_airports else []
-            },
-            "airlines": {
-                "top_performers": [
-                    {
-                        "name": airline,
-                        "market_share": round((count / len(aviation_flights)) * 100, 2)
-                    }
-                    for airline, count in airline_counts.most_common(10)
-                ] if airlines else []
-            },
-            "time_analysis": {
-                "peak_hours": [{"time": slot, "flights": count} for slot, count in peak_hours] if peak_hours else []
+            trend_analysis = {
+                "routes": {
+                    "popular": [
+                        {
+                            "name": route,
+                            "frequency": count,
+                            "demand": "High" if count >= 5 else "Medium" if count >= 3 else "Low"
+                        }
+                        for route, count in route_counts.most_common(10)
+                    ]
+                },
+                "airports": {
+                    "high_demand": [
+                        {
+                            "name": airport,
+                            "total_flights": count,
+                            "departures": departure_counts.get(airport, 0),
+                            "arrivals": arrival_counts.get(airport, 0)
+                        }
+                        for airport, count in all_airports.most_common(10)
+                    ]
+                },
+                "airlines": {
+                    "top_performers": [
+                        {
+                            "name": airline,
+                            "market_share": round((count / aggregates.total) * 100, 2)
+                        }
+                        for airline, count in aggregates.airlines.most_common(10)
+                    ]
+                },
+                "time_analysis": {
+                    "peak_hours": [{"time": slot, "flights": count} for slot, count in peak_hours]
+                }
             }
-        }
         
-        dashboard_summary = {
-            "total_active_flights": len(aviation_flights),
-            "unique_routes": len(route_counts),
-            "active_airports": len(all_airports),
-            "last_updated": datetime.utcnow().isoformat() + "Z",
-            "data_source": "AviationStack API"
-        }
+            dashboard_summary = {
+                "total_active_flights": aggregates.total,
+                "unique_routes": len(route_counts),
+                "active_airports": len(all_airports),
+                "last_updated": datetime.utcfromtimestamp(aggregates.fetched_at).isoformat() + "Z",
+                "data_source": "AviationStack API"
+            }
         
-        return jsonify({
-            "flight_overview": flight_overview,
-            "trend_analysis": trend_analysis,
-            "dashboard_summary": dashboard_summary
-        })
+            return {
+                "flight_overview": flight_overview,
+                "trend_analysis": trend_analysis,
+                "dashboard_summary": dashboard_summary
+            }
+
+        # Rebuilt, re-encoded and recompressed only when the AviationStack data changes
+        return conditional_json_response(("dashboard",), (aggregates.version, aggregates.fetched_at), build_dashboard)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
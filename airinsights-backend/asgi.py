@@ -0,0 +1,34 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from app import app as flask_app
+
+# ASGI entrypoint: uvicorn asgi:app --workers 2
+# asgiref's stock adapter runs every request on one shared thread
+# (thread_sensitive=True), which would serialise the whole worker. Here each
+# request runs on its own thread from a pool of ASGI_THREADS, so that many
+# requests (including long-lived /flights/live and /insights/stream
+# responses) can be in flight per worker. With ASYNC_UPSTREAM=true their
+# upstream HTTP and Gemini calls share one event loop per worker, but each
+# view still blocks its thread until its upstream call returns.
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "64"))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi-view")
+
+# The plain function under asgiref's @sync_to_async decorator. This relies on
+# asgiref internals, so asgiref is pinned in requirements.txt
+_run_wsgi_app = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    async def run_wsgi_app(self, body):
+        await sync_to_async(_run_wsgi_app, thread_sensitive=False, executor=executor)(self, body)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+app = ThreadedWsgiToAsgi(flask_app)
@@ -1,33 +1,237 @@
 import os
+import threading
+import time
 import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from cache import TTLCache
+from circuit_breaker import CircuitBreaker, parse_retry_after
+from http_client import ASYNC_UPSTREAM, upstream
+from json_backend import loads
+from metrics import UPSTREAM_ERRORS, UPSTREAM_RATE_LIMITED, timed
+from time_buckets import departure_slot
 load_dotenv()
 
 API_KEY = os.getenv("AVIATIONSTACK_API_KEY")
-BASE_URL = "http://api.aviationstack.com/v1/flights"
+BASE_URL = os.getenv("AVIATIONSTACK_BASE_URL", "http://api.aviationstack.com/v1/flights")
 
-def get_flight_data(limit=50):
+CACHE_TTL = float(os.getenv("AVIATION_CACHE_TTL", "300"))
+CACHE_STALE_TTL = float(os.getenv("AVIATION_CACHE_STALE_TTL", "3600"))
+CACHE_STALE_IF_ERROR = float(os.getenv("AVIATION_CACHE_STALE_IF_ERROR", "86400"))
+
+PAGE_SIZE = 100
+BULK_PARALLELISM = int(os.getenv("AVIATION_BULK_PARALLELISM", "4"))
+BULK_MIN_INTERVAL = float(os.getenv("AVIATION_BULK_MIN_INTERVAL", "0.25"))
+BULK_MAX_RETRIES = 3
+
+flight_cache = TTLCache(ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, stale_if_error=CACHE_STALE_IF_ERROR, name="aviationstack")
+breaker = CircuitBreaker("aviationstack")
+
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=BULK_PARALLELISM))
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=BULK_PARALLELISM))
+
+def _check_api_key():
     if not API_KEY or API_KEY == "your_api_key_here":
         raise Exception("AviationStack API key is missing. Please set it in your .env file.")
-    params = {
-        "access_key": API_KEY,
-        "limit": limit
-    }
-    response = requests.get(BASE_URL, params=params, timeout=10)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch data from AviationStack: {response.status_code} {response.text}")
-    flights = response.json().get("data", [])
+
+def _count_failure(status_code):
+    if status_code == 429:
+        UPSTREAM_RATE_LIMITED.inc("aviationstack")
+    UPSTREAM_ERRORS.inc("aviationstack")
+
+def _connection_failed():
+    UPSTREAM_ERRORS.inc("aviationstack")
+    breaker.record_failure()
+
+def _check_response(response):
+    """
+    Raise for a failed AviationStack response and report upstream health to the breaker
+    """
+    if response.status_code == 200:
+        breaker.record_success()
+        return
+    _count_failure(response.status_code)
+    if response.status_code == 429:
+        breaker.record_failure(parse_retry_after(response.headers.get("Retry-After")) or 0.0)
+    elif response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        # The upstream answered; a rejected key or bad parameters is not an outage
+        breaker.record_success()
+    raise Exception(f"Failed to fetch data from AviationStack: {response.status_code} {response.text}")
+
+def _parse_flights(flights):
     return [
         {
             "airline": f.get("airline", {}).get("name"),
             "flight_number": f.get("flight", {}).get("iata"),
             "departure_airport": f.get("departure", {}).get("airport"),
             "arrival_airport": f.get("arrival", {}).get("airport"),
+            "departure_iata": f.get("departure", {}).get("iata"),
+            "departure_icao": f.get("departure", {}).get("icao"),
+            "arrival_iata": f.get("arrival", {}).get("iata"),
+            "arrival_icao": f.get("arrival", {}).get("icao"),
             "departure_country": f.get("departure", {}).get("country"),
             "arrival_country": f.get("arrival", {}).get("country"),
             "departure_time": f.get("departure", {}).get("scheduled"),
+            # Parsed once here so aggregation never re-parses ISO strings
+            "departure_slot": departure_slot(f.get("departure", {}).get("scheduled"), f.get("departure", {}).get("timezone")),
+            "departure_timezone": f.get("departure", {}).get("timezone"),
             "arrival_time": f.get("arrival", {}).get("scheduled"),
             "status": f.get("flight_status")
         }
         for f in flights if f.get("departure") and f.get("arrival")
     ]
+
+def get_flight_data(limit=50, **filters):
+    _check_api_key()
+    params = {
+        "access_key": API_KEY,
+        "limit": limit
+    }
+    params.update(filters)
+    breaker.check()
+    try:
+        with timed("aviationstack.fetch"):
+            response = session.get(BASE_URL, params=params, timeout=10)
+    except Exception:
+        _connection_failed()
+        raise
+    _check_response(response)
+    with timed("aviationstack.parse"):
+        flights = loads(response.content).get("data", [])
+        return _parse_flights(flights)
+
+async def get_flight_data_async(limit=50, **filters):
+    """
+    get_flight_data on the shared async HTTP client; await it on the upstream loop
+    """
+    _check_api_key()
+    params = {
+        "access_key": API_KEY,
+        "limit": limit
+    }
+    params.update(filters)
+    breaker.check()
+    try:
+        with timed("aviationstack.fetch"):
+            response = await upstream.client.get(BASE_URL, params=params)
+    except Exception:
+        _connection_failed()
+        raise
+    _check_response(response)
+    with timed("aviationstack.parse"):
+        flights = loads(response.content).get("data", [])
+        return _parse_flights(flights)
+
+def get_cached_flight_data(limit=50, **filters):
+    """
+    Cached get_flight_data shared by every request in this process.
+    Keyed by limit and filters; stale results are served while one
+    background refresh hits AviationStack.
+    """
+    return get_cached_flight_entry(limit=limit, **filters).value
+
+def get_cached_flight_entry(limit=50, **filters):
+    """
+    get_cached_flight_data as a cache entry, with its version and fetch time
+    """
+    key = (limit, tuple(sorted(filters.items())))
+    if ASYNC_UPSTREAM:
+        return flight_cache.get_entry(key, lambda: upstream.run(get_flight_data_async(limit=limit, **filters)))
+    return flight_cache.get_entry(key, lambda: get_flight_data(limit=limit, **filters))
+
+
+class RateLimiter:
+    """
+    Spaces out request starts by ``min_interval`` seconds and lets a 429
+    pause every caller until the upstream's Retry-After has passed.
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+bulk_rate_limiter = RateLimiter(BULK_MIN_INTERVAL)
+
+def _fetch_page(offset, page_size, filters):
+    """
+    One AviationStack page as (parsed flights, pagination), retrying on 429
+    """
+    params = {
+        "access_key": API_KEY,
+        "limit": page_size,
+        "offset": offset
+    }
+    params.update(filters)
+    breaker.check()
+    for attempt in range(BULK_MAX_RETRIES + 1):
+        bulk_rate_limiter.acquire()
+        try:
+            with timed("aviationstack.fetch_page"):
+                response = session.get(BASE_URL, params=params, timeout=10)
+        except Exception:
+            _connection_failed()
+            raise
+        if response.status_code == 429 and attempt < BULK_MAX_RETRIES:
+            UPSTREAM_RATE_LIMITED.inc("aviationstack")
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is None:
+                retry_after = 2.0 ** attempt
+            print(f"AviationStack rate limited at offset {offset}, retrying in {retry_after}s...")
+            bulk_rate_limiter.pause(retry_after)
+            continue
+        _check_response(response)
+        with timed("aviationstack.parse"):
+            payload = loads(response.content)
+            return _parse_flights(payload.get("data", [])), payload.get("pagination", {})
+
+def iter_flight_pages(total, page_size=PAGE_SIZE, parallelism=BULK_PARALLELISM, **filters):
+    """
+    Walk AviationStack's offset pagination and yield parsed pages as they arrive.
+
+    The first page tells us how many flights exist; the rest are fetched
+    concurrently with at most ``parallelism`` pages in flight, so raw JSON
+    for the whole result set is never held at once. Pages are yielded in
+    completion order, not offset order.
+    """
+    _check_api_key()
+    first_page, pagination = _fetch_page(0, page_size, filters)
+    yield first_page
+
+    available = pagination.get("total")
+    if available is not None:
+        total = min(total, int(available))
+    offsets = iter(range(page_size, total, page_size))
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="aviation-page") as executor:
+        in_flight = set()
+        for offset in offsets:
+            in_flight.add(executor.submit(_fetch_page, offset, min(page_size, total - offset), filters))
+            if len(in_flight) >= parallelism:
+                break
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                page, _ = future.result()
+                offset = next(offsets, None)
+                if offset is not None:
+                    in_flight.add(executor.submit(_fetch_page, offset, min(page_size, total - offset), filters))
+                yield page
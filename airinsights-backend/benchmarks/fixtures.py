@@ -0,0 +1,136 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from utils import get_airport_table
+
+STATUSES = ("scheduled", "active", "landed", "scheduled", "active", "delayed", "cancelled", "diverted")
+AIRLINES = (
+    ("Qantas", "QF", "QFA"), ("Virgin Australia", "VA", "VOZ"), ("Jetstar", "JQ", "JST"),
+    ("Emirates", "EK", "UAE"), ("Singapore Airlines", "SQ", "SIA"), ("Air New Zealand", "NZ", "ANZ"),
+    ("United Airlines", "UA", "UAL"), ("Cathay Pacific", "CX", "CPA"), ("Rex Airlines", "ZL", "RXA"),
+)
+
+# Recorded payloads dropped here (aviationstack.json, flightradar24.json,
+# opensky.json) are replayed instead of the synthetic ones
+RECORDED_DIR = os.path.join(os.path.dirname(__file__), "recorded")
+
+
+def _recorded(name: str, fixtures_dir: Optional[str]) -> Optional[Dict]:
+    path = os.path.join(fixtures_dir or RECORDED_DIR, f"{name}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _replicate(records: List, scale: int) -> List:
+    """
+    Repeat recorded records up to ``scale`` entries
+    """
+    if not records:
+        return []
+    return [records[i % len(records)] for i in range(scale)]
+
+
+def aviationstack_flights(scale: int, seed: int = 0, fixtures_dir: Optional[str] = None) -> List[Dict]:
+    """
+    ``scale`` raw AviationStack flight records spread over one day
+    """
+    recorded = _recorded("aviationstack", fixtures_dir)
+    if recorded is not None:
+        return _replicate(recorded.get("data", []), scale)
+
+    rng = random.Random(seed)
+    airports = sorted(set(get_airport_table().values()))
+    day = datetime(2025, 1, 15)
+    flights = []
+    for i in range(scale):
+        dep, arr = rng.sample(airports, 2)
+        name, iata, _ = rng.choice(AIRLINES)
+        departs = day + timedelta(minutes=rng.randrange(24 * 60))
+        flights.append({
+            "flight_date": day.date().isoformat(),
+            "flight_status": rng.choice(STATUSES),
+            "departure": {
+                "airport": dep.name,
+                "timezone": dep.timezone,
+                "iata": dep.iata,
+                "icao": dep.icao,
+                "scheduled": departs.isoformat() + "+00:00",
+            },
+            "arrival": {
+                "airport": arr.name,
+                "timezone": arr.timezone,
+                "iata": arr.iata,
+                "icao": arr.icao,
+                "scheduled": (departs + timedelta(minutes=rng.randrange(45, 900))).isoformat() + "+00:00",
+            },
+            "airline": {"name": name, "iata": iata},
+            "flight": {"number": str(100 + i % 900), "iata": f"{iata}{100 + i % 900}"},
+        })
+    return flights
+
+
+def _aircraft(scale: int, seed: int, id_offset: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    aircraft = []
+    for i in range(scale):
+        _, _, icao = rng.choice(AIRLINES)
+        on_ground = rng.random() < 0.15
+        aircraft.append({
+            "icao24": f"{0x7c0000 + id_offset + i:06x}",
+            "callsign": f"{icao}{rng.randrange(1, 9999)}",
+            "latitude": round(rng.uniform(-43.5, -10.5), 4),
+            "longitude": round(rng.uniform(112.5, 153.5), 4),
+            "altitude": 0 if on_ground else rng.randrange(1000, 41000, 100),
+            "knots": 0 if on_ground else rng.randrange(120, 520),
+            "vertical_rate": 0 if on_ground else rng.choice((-1536, -640, 0, 0, 0, 640, 1920)),
+            "on_ground": on_ground,
+            "origin": rng.choice(("SYD", "MEL", "BNE", "PER", "ADL", "CBR", "OOL", "CNS")),
+            "destination": rng.choice(("SYD", "MEL", "BNE", "PER", "ADL", "HBA", "DRW", "AKL")),
+        })
+    return aircraft
+
+
+def flightradar_feed(scale: int, seed: int = 1, fixtures_dir: Optional[str] = None) -> Dict:
+    """
+    FlightRadar24 feed.js payload with ``scale`` aircraft
+    """
+    recorded = _recorded("flightradar24", fixtures_dir)
+    if recorded is not None:
+        items = list(recorded.get("aircraft", {}).items())
+        aircraft = {}
+        for i in range(scale if items else 0):
+            key, value = items[i % len(items)]
+            # Copies need their own icao24 or the merge would drop them
+            aircraft[key if i < len(items) else f"{key}-{i // len(items)}"] = value
+        return {"full_count": scale, "version": 4, "aircraft": aircraft}
+
+    aircraft = {}
+    for a in _aircraft(scale, seed):
+        aircraft[a["icao24"]] = [
+            a["icao24"], a["latitude"], a["longitude"], 90, a["altitude"], a["knots"], a["vertical_rate"],
+            "T-MLAT", 1 if a["on_ground"] else 0, "B738", "VH-XXX", a["origin"], a["destination"], "",
+            0, 0, a["callsign"], 0,
+        ]
+    return {"full_count": scale, "version": 4, "aircraft": aircraft, "stats": {"total": {"ads-b": scale}}}
+
+
+def opensky_states(scale: int, seed: int = 2, fixtures_dir: Optional[str] = None) -> Dict:
+    """
+    OpenSky /states/all payload; overlaps half of the FlightRadar24 fleet
+    """
+    recorded = _recorded("opensky", fixtures_dir)
+    if recorded is not None:
+        return {"time": recorded.get("time", 0), "states": _replicate(recorded.get("states") or [], scale)}
+
+    states = []
+    for a in _aircraft(scale, seed, id_offset=scale // 2):
+        states.append([
+            a["icao24"], a["callsign"].ljust(8), "Australia", 1736900000, 1736900000,
+            a["longitude"], a["latitude"], a["altitude"] * 0.3048, a["on_ground"], a["knots"] * 0.514444,
+            90.0, a["vertical_rate"] * 0.00508, None, a["altitude"] * 0.3048, "1000", False, 0,
+        ])
+    return {"time": 1736900000, "states": states}
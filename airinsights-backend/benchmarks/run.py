@@ -0,0 +1,235 @@
+"""
+Offline benchmarks for the ingestion and API hot paths.
+
+    cd airinsights-backend
+    python -m benchmarks.run                          # 100, 1k, 10k and 100k
+    python -m benchmarks.run --scales 1000 --iterations 50 --output results.json
+    python -m benchmarks.run --baseline results.json  # exit 1 on a p50 regression
+
+Each scale runs in its own process against a local stub of AviationStack,
+FlightRadar24 and OpenSky (see stub_server.py), so no API keys or network
+are needed and peak memory is not skewed by earlier scales.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_SCALES = (100, 1000, 10000, 100000)
+TARGETS = ("get_flight_data", "get_all_real_flight_data", "filter_flights", "get_dashboard_data", "trend_analytics")
+
+FILTER_QUERY = "/flights/filter?country=Australia&min_altitude=10000&bounds=-40,-20,130,155&limit=1000"
+
+
+def default_iterations(scale: int) -> int:
+    if scale <= 1000:
+        return 20
+    return 5 if scale <= 10000 else 3
+
+
+def _configure_environment(stub_env: Dict[str, str], scale: int) -> None:
+    os.environ.update(stub_env)
+    os.environ.update({
+        "AVIATIONSTACK_API_KEY": "benchmark",
+        "GEMINI_API_KEY": "benchmark",
+        "ANALYTICS_FLIGHT_LIMIT": str(scale),
+        "AVIATION_BULK_MIN_INTERVAL": "0",
+        "FLIGHT_HISTORY_DB": "",
+        "INSIGHTS_CACHE_DB": "",
+        "ASYNC_UPSTREAM": "false",
+    })
+
+
+def _targets(scale: int) -> Tuple[Dict[str, Tuple[Callable, int]], Callable]:
+    """
+    (call, items processed) per target plus a reset that drops every cache,
+    so each measured call does the full fetch/parse/compute/encode work
+    """
+    import analytics
+    import aviation
+    import http_cache
+    import json_backend
+    from app import app
+    from flight_scraper import flight_fetcher
+    from live_traffic import traffic_poller
+
+    # Benchmarks poll explicitly instead of running the background thread
+    traffic_poller.start = lambda: None
+    traffic_poller.poll_once()
+    client = app.test_client()
+
+    def get(path: str) -> Callable:
+        def call():
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            return response.get_data()
+        return call
+
+    def reset():
+        aviation.flight_cache.clear()
+        json_backend.response_cache.clear()
+        http_cache.compressed_cache.clear()
+        with analytics._memo_lock:
+            analytics._memo.clear()
+
+    targets = {
+        "get_flight_data": (lambda: aviation.get_flight_data(limit=scale), scale),
+        "get_all_real_flight_data": (flight_fetcher.get_all_real_flight_data, scale),
+        "filter_flights": (get(FILTER_QUERY), len(traffic_poller.snapshot().table)),
+        "get_dashboard_data": (get("/flights/dashboard"), scale),
+        "trend_analytics": (get("/flights/trends"), scale),
+    }
+    return targets, reset
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def measure(call: Callable, reset: Callable, items: int, iterations: int) -> Dict:
+    reset()
+    call()  # warm-up: imports, connection pools, lazy tables
+
+    timings = []
+    for _ in range(iterations):
+        reset()
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+
+    # Separate run, since tracing allocations slows the call down
+    reset()
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    return {
+        "iterations": iterations,
+        "items": items,
+        "mean_ms": mean * 1000,
+        "p50_ms": _percentile(timings, 50) * 1000,
+        "p95_ms": _percentile(timings, 95) * 1000,
+        "p99_ms": _percentile(timings, 99) * 1000,
+        "calls_per_s": 1 / mean if mean else 0.0,
+        "items_per_s": items / mean if mean else 0.0,
+        "peak_mb": peak / 1e6,
+    }
+
+
+def run_worker(scale: int, iterations: int, targets: List[str], fixtures_dir: Optional[str]) -> List[Dict]:
+    """
+    Benchmark one scale in this process: start the stub, point the app at it, measure
+    """
+    from benchmarks.stub_server import StubUpstream
+
+    stub = StubUpstream(scale, fixtures_dir).start()
+    _configure_environment(stub.env(), scale)
+    try:
+        available, reset = _targets(scale)
+        results = []
+        for name in targets:
+            call, items = available[name]
+            try:
+                result = measure(call, reset, items, iterations)
+            except Exception as e:
+                result = {"error": str(e)}
+            results.append({"scale": scale, "target": name, **result})
+        return results
+    finally:
+        stub.stop()
+
+
+def print_table(results: List[Dict]) -> None:
+    header = f"{'scale':>7}  {'target':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'items/s':>12}{'peak MB':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if "error" in r:
+            print(f"{r['scale']:>7}  {r['target']:<26}ERROR {r['error']}")
+            continue
+        print(f"{r['scale']:>7}  {r['target']:<26}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['items_per_s']:>12,.0f}{r['peak_mb']:>10.1f}")
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    """
+    Targets whose p50 is more than ``tolerance`` slower than the baseline run
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scale"], r["target"]): r for r in json.load(f) if "p50_ms" in r}
+    regressions = []
+    for r in results:
+        before = baseline.get((r["scale"], r["target"]))
+        if before is None or "p50_ms" not in r:
+            continue
+        if r["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{r['target']} @ {r['scale']}: p50 {before['p50_ms']:.2f} -> {r['p50_ms']:.2f} ms")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline AirInsights benchmarks")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="comma-separated aircraft/flight counts")
+    parser.add_argument("--targets", default=",".join(TARGETS), help="comma-separated subset of: " + ", ".join(TARGETS))
+    parser.add_argument("--iterations", type=int, default=None, help="timed calls per target (default depends on scale)")
+    parser.add_argument("--fixtures", default=None, help="directory of recorded payloads to replay")
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare p50 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown vs baseline (0.2 = 20%%)")
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    if args.worker is not None:
+        results = run_worker(args.worker, args.iterations or default_iterations(args.worker), targets, args.fixtures)
+        print(json.dumps(results))
+        return 0
+
+    results = []
+    for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+        command = [sys.executable, "-m", "benchmarks.run", "--worker", str(scale), "--targets", ",".join(targets)]
+        if args.iterations:
+            command += ["--iterations", str(args.iterations)]
+        if args.fixtures:
+            command += ["--fixtures", args.fixtures]
+        print(f"Running scale {scale}...", file=sys.stderr)
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            return completed.returncode
+        # The app prints upstream errors to stdout; the results are the last line
+        results += json.loads(completed.stdout.strip().splitlines()[-1])
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
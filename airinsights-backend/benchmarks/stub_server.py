@@ -0,0 +1,92 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+from benchmarks import fixtures
+
+AVIATIONSTACK_PATH = "/v1/flights"
+FLIGHTRADAR_PATH = "/zones/fcgi/feed.js"
+OPENSKY_PATH = "/api/states/all"
+
+
+class StubUpstream:
+    """
+    Local stand-in for AviationStack, FlightRadar24 and OpenSky serving
+    fixtures at a fixed scale. Payloads are encoded once up front so the
+    server adds as little as possible to the measured latency.
+    """
+
+    def __init__(self, scale: int, fixtures_dir: Optional[str] = None):
+        self.scale = scale
+        self.flights = fixtures.aviationstack_flights(scale, fixtures_dir=fixtures_dir)
+        self.flightradar = gzip.compress(json.dumps(fixtures.flightradar_feed(scale, fixtures_dir=fixtures_dir)).encode(), 1)
+        self.opensky = gzip.compress(json.dumps(fixtures.opensky_states(scale, fixtures_dir=fixtures_dir)).encode(), 1)
+        self.requests = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def env(self) -> dict:
+        """
+        Environment pointing the app's upstream clients at this server
+        """
+        return {
+            "AVIATIONSTACK_BASE_URL": self.base_url + AVIATIONSTACK_PATH,
+            "FR24_FEED_URL": self.base_url + FLIGHTRADAR_PATH,
+            "OPENSKY_STATES_URL": self.base_url + OPENSKY_PATH,
+        }
+
+    def aviationstack_page(self, query: dict) -> bytes:
+        limit = int(query.get("limit", ["100"])[0])
+        offset = int(query.get("offset", ["0"])[0])
+        page = self.flights[offset:offset + limit]
+        return json.dumps({
+            "pagination": {"limit": limit, "offset": offset, "count": len(page), "total": len(self.flights)},
+            "data": page,
+        }).encode()
+
+    def start(self) -> "StubUpstream":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; without this, delayed ACKs add ~40 ms per request
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.requests += 1
+                url = urlparse(self.path)
+                encoding = None
+                if url.path == AVIATIONSTACK_PATH:
+                    body = stub.aviationstack_page(parse_qs(url.query))
+                elif url.path == FLIGHTRADAR_PATH:
+                    body, encoding = stub.flightradar, "gzip"
+                elif url.path == OPENSKY_PATH:
+                    body, encoding = stub.opensky, "gzip"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stub-upstream", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
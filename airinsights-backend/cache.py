@@ -0,0 +1,236 @@
+import hashlib
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional
+from metrics import CACHE_REQUESTS
+
+
+_entry_versions = itertools.count(1)
+
+
+class CacheEntry:
+    """
+    A cached value together with the time it was loaded. ``version`` is
+    unique per load in this process and ``fetched_at`` is the wall-clock
+    load time, so callers can tell clients which data they are seeing.
+    """
+
+    __slots__ = ("value", "loaded_at", "refreshing", "version", "fetched_at")
+
+    def __init__(self, value: Any, loaded_at: float):
+        self.value = value
+        self.loaded_at = loaded_at
+        self.refreshing = False
+        self.version = next(_entry_versions)
+        self.fetched_at = time.time()
+
+
+class TTLCache:
+    """
+    Process-wide cache with a time-to-live and stale-while-revalidate.
+
+    Fresh entries are returned directly. Entries older than ``ttl`` but
+    younger than ``ttl + stale_ttl`` are still returned while a single
+    background thread reloads them. Missing or fully expired entries are
+    loaded synchronously, and concurrent callers for the same key wait on
+    that one load instead of each hitting the upstream. If that load fails,
+    an entry up to ``stale_if_error`` seconds past its stale window is
+    returned instead of the error, and callers that were waiting on the
+    failed load get the same result rather than retrying it one by one.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, stale_if_error: float = 0.0, name: str = "ttl"):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stale_if_error = stale_if_error
+        self.name = name
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        # key -> (exception, monotonic time) of the last failed synchronous load
+        self._failures: Dict[Hashable, tuple] = {}
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for ``key``, calling ``loader`` when needed
+        """
+        return self.get_entry(key, loader).value
+
+    def get_entry(self, key: Hashable, loader: Callable[[], Any]) -> CacheEntry:
+        """
+        Like get, but returns the entry so its version and fetch time are available
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if entry is not None:
+            age = now - entry.loaded_at
+            if age < self.ttl:
+                CACHE_REQUESTS.inc(self.name, "hit")
+                return entry
+            if age < self.ttl + self.stale_ttl:
+                CACHE_REQUESTS.inc(self.name, "stale")
+                self._refresh_in_background(key, entry, loader)
+                return entry
+
+        with self._key_lock(key):
+            # Another caller may have finished the load while we waited
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.ttl:
+                CACHE_REQUESTS.inc(self.name, "hit")
+                return entry
+            failure = self._failures.get(key)
+            if failure is not None and failure[1] >= now:
+                # The load we were waiting on failed; share its outcome instead of retrying
+                return self._stale_or_raise(key, entry, failure[0])
+            CACHE_REQUESTS.inc(self.name, "miss")
+            try:
+                value = loader()
+            except Exception as e:
+                self._failures[key] = (e, time.monotonic())
+                return self._stale_or_raise(key, entry, e)
+            self._failures.pop(key, None)
+            entry = self._entries[key] = CacheEntry(value, time.monotonic())
+            return entry
+
+    def _stale_or_raise(self, key: Hashable, entry: Optional[CacheEntry], error: Exception) -> CacheEntry:
+        if entry is not None and time.monotonic() - entry.loaded_at < self.ttl + self.stale_ttl + self.stale_if_error:
+            print(f"Cache reload failed for {key!r}, serving stale value: {error}")
+            return entry
+        raise error
+
+    def _refresh_in_background(self, key: Hashable, entry: CacheEntry, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if entry.refreshing:
+                return
+            entry.refreshing = True
+
+        def refresh():
+            try:
+                with self._key_lock(key):
+                    value = loader()
+                    self._entries[key] = CacheEntry(value, time.monotonic())
+            except Exception as e:
+                print(f"Background cache refresh failed for {key!r}: {e}")
+            finally:
+                entry.refreshing = False
+
+        threading.Thread(target=refresh, name="cache-refresh", daemon=True).start()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._failures.clear()
+
+
+VOLATILE_KEYS = frozenset({"timestamp", "last_updated"})
+
+def _canonical(data: Any, ignore_keys: frozenset) -> Any:
+    if isinstance(data, dict):
+        return {str(k): _canonical(v, ignore_keys) for k, v in data.items() if k not in ignore_keys}
+    if isinstance(data, (list, tuple)):
+        return [_canonical(v, ignore_keys) for v in data]
+    return data
+
+def content_hash(data: Any, ignore_keys: frozenset = VOLATILE_KEYS) -> str:
+    """
+    Stable SHA-256 of JSON-like data. Dict key order and volatile fields such
+    as fetch timestamps do not change the hash, so re-posted snapshots match.
+    """
+    canonical = json.dumps(_canonical(data, ignore_keys), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded in-memory cache with optional expiry
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None, name: str = "lru"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.name = name
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                CACHE_REQUESTS.inc(self.name, "miss")
+                return None
+            if self.ttl is not None and time.monotonic() - entry.loaded_at >= self.ttl:
+                del self._entries[key]
+                CACHE_REQUESTS.inc(self.name, "miss")
+                return None
+            self._entries.move_to_end(key)
+            CACHE_REQUESTS.inc(self.name, "hit")
+            return entry.value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = CacheEntry(value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk string cache that survives restarts, keyed by text with optional expiry
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_rows: int = 10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_created ON cache (created)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if self.ttl is not None and time.time() - created >= self.ttl:
+            return None
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)", (key, value, time.time()))
+            conn.execute(
+                "DELETE FROM cache WHERE key NOT IN (SELECT key FROM cache ORDER BY created DESC LIMIT ?)",
+                (self.max_rows,)
+            )
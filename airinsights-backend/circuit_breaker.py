@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from metrics import CIRCUIT_STATE, UPSTREAM_SHORT_CIRCUITED
+
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+BASE_BACKOFF = float(os.getenv("CIRCUIT_BASE_BACKOFF", "5"))
+MAX_BACKOFF = float(os.getenv("CIRCUIT_MAX_BACKOFF", "300"))
+PROBE_TIMEOUT = 30.0
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an upstream whose circuit is open
+    """
+
+    def __init__(self, source: str, retry_after: float):
+        super().__init__(f"{source} is unavailable, retrying in {retry_after:.1f}s")
+        self.source = source
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+
+    After ``failure_threshold`` consecutive failures (or one 429) the circuit
+    opens and calls are skipped for a backoff that doubles with every
+    consecutive trip, up to ``max_backoff``; a Retry-After from the upstream
+    extends it. Once the backoff has passed, a single caller is let through
+    as a half-open probe: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, source: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 base_backoff: float = BASE_BACKOFF, max_backoff: float = MAX_BACKOFF):
+        self.source = source
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], self.source)
+
+    def retry_in(self) -> float:
+        """
+        Seconds until the next call is let through
+        """
+        return max(0.0, self.open_until - time.monotonic())
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go to the upstream now. A caller that gets True
+        must report back with record_success or record_failure.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now >= self.open_until:
+                self._set_state(HALF_OPEN)
+                self._probe_started = now
+                return True
+            if self.state == HALF_OPEN and now - self._probe_started >= PROBE_TIMEOUT:
+                # The last probe never reported back; let another one through
+                self._probe_started = now
+                return True
+        UPSTREAM_SHORT_CIRCUITED.inc(self.source)
+        return False
+
+    def check(self) -> None:
+        """
+        allow(), raising CircuitOpenError when the call should be skipped
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.source, self.retry_in())
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.trips = 0
+            if self.state != CLOSED:
+                print(f"{self.source} recovered, closing circuit")
+                self._set_state(CLOSED)
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        """
+        Count a failed call; ``retry_after`` (from a 429) opens the circuit at once
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == OPEN:
+                # A call that was already in flight when the circuit opened
+                if retry_after is not None:
+                    self.open_until = max(self.open_until, time.monotonic() + retry_after)
+                return
+            if self.state == CLOSED and self.failures < self.failure_threshold and retry_after is None:
+                return
+            self.trips += 1
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.trips - 1))
+            if retry_after is not None:
+                backoff = max(backoff, retry_after)
+            self.open_until = time.monotonic() + backoff
+            self._set_state(OPEN)
+        print(f"{self.source} circuit open for {backoff:.1f}s after {self.failures} failure(s)")
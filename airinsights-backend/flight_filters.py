@@ -0,0 +1,74 @@
+from typing import Callable, List, Optional
+import numpy as np
+from flight_state import FlightStateTable
+
+Predicate = Callable[[FlightStateTable], np.ndarray]
+
+
+def _range_predicate(column: str, low: Optional[float], high: Optional[float]) -> Predicate:
+    # NaN compares False, so rows with an unknown value never match a bound
+    if low is not None and high is not None:
+        return lambda table: (table.numeric[column] >= low) & (table.numeric[column] <= high)
+    if low is not None:
+        return lambda table: table.numeric[column] >= low
+    return lambda table: table.numeric[column] <= high
+
+
+def _string_predicate(column: str, key: tuple, matches: Callable[[str], bool]) -> Predicate:
+    # Strings are interned, so the match runs once per distinct value, not once per aircraft
+    def predicate(table: FlightStateTable) -> np.ndarray:
+        return table.pool.match_table(key, matches)[table.strings[column]]
+    return predicate
+
+
+class FlightFilter:
+    """
+    Validated /flights/filter parameters compiled into boolean mask operations
+    over a FlightStateTable. All predicates are ANDed together.
+    """
+
+    def __init__(self, country: Optional[str] = None, on_ground: Optional[bool] = None,
+                 min_speed: Optional[float] = None, max_speed: Optional[float] = None,
+                 min_altitude: Optional[float] = None, max_altitude: Optional[float] = None,
+                 min_vertical_rate: Optional[float] = None, max_vertical_rate: Optional[float] = None,
+                 callsign_prefix: Optional[str] = None):
+        self.country = country
+        self.on_ground = on_ground
+        self.min_speed, self.max_speed = min_speed, max_speed
+        self.min_altitude, self.max_altitude = min_altitude, max_altitude
+        self.min_vertical_rate, self.max_vertical_rate = min_vertical_rate, max_vertical_rate
+        self.callsign_prefix = callsign_prefix
+        self.params = (country, on_ground, min_speed, max_speed, min_altitude, max_altitude,
+                       min_vertical_rate, max_vertical_rate, callsign_prefix)
+        self.predicates: List[Predicate] = []
+
+        if country:
+            country_lower = country.lower()
+            self.predicates.append(_string_predicate("origin_country", ("country", country_lower), lambda value: value.lower() == country_lower))
+        if on_ground is not None:
+            self.predicates.append(lambda table: table.on_ground == on_ground)
+        if min_speed is not None or max_speed is not None:
+            self.predicates.append(_range_predicate("velocity_kmh", min_speed, max_speed))
+        if min_altitude is not None or max_altitude is not None:
+            self.predicates.append(_range_predicate("altitude", min_altitude, max_altitude))
+        if min_vertical_rate is not None or max_vertical_rate is not None:
+            self.predicates.append(_range_predicate("vertical_rate", min_vertical_rate, max_vertical_rate))
+        if callsign_prefix:
+            prefix = callsign_prefix.upper()
+            self.predicates.append(_string_predicate("callsign", ("callsign", prefix), lambda value: value.upper().startswith(prefix)))
+
+    def key(self) -> tuple:
+        return self.params
+
+    def mask(self, table: FlightStateTable) -> np.ndarray:
+        mask = np.ones(len(table), dtype=bool)
+        for predicate in self.predicates:
+            mask &= predicate(table)
+        return mask
+
+    def apply(self, table: FlightStateTable, limit: Optional[int] = None) -> np.ndarray:
+        """
+        Row indices of matching aircraft, in table order, capped at ``limit``
+        """
+        indices = np.flatnonzero(self.mask(table))
+        return indices[:limit] if limit is not None else indices
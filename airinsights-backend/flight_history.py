@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from flight_state import NUMERIC_COLUMNS, STRING_COLUMNS, ChangeSet, FlightStateBuilder, FlightStateTable
+from spatial_index import cell_ids, cells_overlapping
+load_dotenv()
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Relative paths are resolved against this directory, not the working directory
+HISTORY_DB = os.getenv("FLIGHT_HISTORY_DB", "flight_history.sqlite3")
+HISTORY_RETENTION_HOURS = float(os.getenv("FLIGHT_HISTORY_RETENTION_HOURS", "24"))
+PRUNE_INTERVAL = 600
+
+# Above this many cells a bounds query just scans the time index
+MAX_QUERY_CELLS = 500
+
+COLUMNS = ("ts", "icao24", "cell") + NUMERIC_COLUMNS + ("on_ground",) + STRING_COLUMNS
+
+
+class PositionHistory:
+    """
+    Append-only SQLite log of live aircraft states.
+
+    The poller records each ChangeSet (aircraft that appeared or changed),
+    so an aircraft sitting still costs no position rows. Which aircraft
+    were live when is kept separately as sightings: one row per continuous
+    presence in the snapshot, whose last_seen advances with every poll in
+    a single UPDATE. Anything older than ``retention_hours`` is pruned,
+    except that an aircraft still live keeps its latest position.
+
+    Every worker process polls on its own, but only the one holding an
+    exclusive lock on ``<path>.lock`` writes; the others only read. If the
+    writer exits, the next worker to record takes over.
+    """
+
+    def __init__(self, path: str, retention_hours: float = HISTORY_RETENTION_HOURS):
+        self.path = path
+        self.retention = retention_hours * 3600
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._writer_lock = None
+        with self._connect() as conn:
+            # WAL lets requests read the history while the poller is writing
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS positions ("
+                "ts REAL NOT NULL, icao24 TEXT NOT NULL, cell INTEGER NOT NULL, "
+                "latitude REAL, longitude REAL, altitude REAL, velocity_kmh REAL, vertical_rate REAL, "
+                "on_ground INTEGER NOT NULL, callsign TEXT, origin_country TEXT, destination_country TEXT, "
+                "origin_airport TEXT, destination_airport TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS positions_ts ON positions (ts, icao24)")
+            conn.execute("CREATE INDEX IF NOT EXISTS positions_icao24 ON positions (icao24, ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS positions_cell ON positions (cell, ts)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sightings ("
+                "icao24 TEXT NOT NULL, first_seen REAL NOT NULL, last_seen REAL NOT NULL, open INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sightings_open ON sightings (icao24) WHERE open = 1")
+            conn.execute("CREATE INDEX IF NOT EXISTS sightings_seen ON sightings (last_seen, first_seen)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _claim_writer(self) -> bool:
+        """
+        Whether this process is the writer, taking the lock if it is free
+        """
+        if self._writer_lock is not None:
+            return True
+        lock_file = open(self.path + ".lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self._writer_lock = lock_file
+        return True
+
+    def record(self, table: FlightStateTable, changes: ChangeSet, ts: float) -> int:
+        """
+        Append the added and updated rows of ``table`` in one transaction;
+        returns rows written (0 in a process that is not the writer)
+        """
+        with self._lock:
+            if self._writer_lock is None:
+                if not self._claim_writer():
+                    return 0
+                # Sightings left open by a previous writer ended with it; this
+                # process starts a sighting and a position for everything it has
+                changes = ChangeSet(added=np.arange(len(table)), updated=np.empty(0, dtype=np.intp), removed=[])
+                with self._connect() as conn:
+                    conn.execute("UPDATE sightings SET open = 0 WHERE open = 1")
+            return self._record(table, changes, ts)
+
+    def _record(self, table: FlightStateTable, changes: ChangeSet, ts: float) -> int:
+        rows = np.concatenate([changes.added, changes.updated])
+        changed = table.take(rows)
+        numeric = [
+            [None if np.isnan(v) else v for v in changed.numeric[name].tolist()]
+            for name in NUMERIC_COLUMNS
+        ]
+        strings = [changed.pool.decode(changed.strings[name]) for name in STRING_COLUMNS]
+        cells = cell_ids(np.nan_to_num(changed.numeric["latitude"]), np.nan_to_num(changed.numeric["longitude"]))
+        values = zip(
+            [ts] * len(changed), changed.icao24.tolist(), cells.tolist(),
+            *numeric, changed.on_ground.astype(int).tolist(), *strings
+        )
+
+        placeholders = ", ".join("?" * len(COLUMNS))
+        with self._connect() as conn:
+            conn.executemany("UPDATE sightings SET open = 0 WHERE open = 1 AND icao24 = ?", ((i,) for i in changes.removed))
+            conn.executemany(
+                "INSERT INTO sightings (icao24, first_seen, last_seen, open) VALUES (?, ?, ?, 1)",
+                ((i, ts, ts) for i in table.icao24[changes.added].tolist())
+            )
+            # Every aircraft still in the snapshot was live at this poll, changed or not
+            conn.execute("UPDATE sightings SET last_seen = ? WHERE open = 1", (ts,))
+            conn.executemany(f"INSERT INTO positions ({', '.join(COLUMNS)}) VALUES ({placeholders})", values)
+            if ts - self._last_prune >= PRUNE_INTERVAL:
+                self._prune(conn, ts - self.retention)
+                self._last_prune = ts
+        return len(changed)
+
+    def _prune(self, conn: sqlite3.Connection, cutoff: float) -> None:
+        # A live aircraft whose last change is older than the cutoff keeps that
+        # state, re-stamped at the cutoff, so window queries still find it
+        conn.execute(
+            f"INSERT INTO positions ({', '.join(COLUMNS)}) "
+            f"SELECT ?, {', '.join(COLUMNS[1:])} FROM ("
+            f"SELECT MAX(ts), {', '.join(COLUMNS[1:])} FROM positions "
+            "WHERE ts < ? AND icao24 IN (SELECT icao24 FROM sightings WHERE open = 1) "
+            "AND icao24 NOT IN (SELECT icao24 FROM positions WHERE ts >= ?) GROUP BY icao24)",
+            (cutoff, cutoff, cutoff)
+        )
+        # Deleted pages are reused by later inserts, so the file stops growing
+        conn.execute("DELETE FROM positions WHERE ts < ?", (cutoff,))
+        conn.execute("DELETE FROM sightings WHERE open = 0 AND last_seen < ?", (cutoff,))
+
+    def latest_between(self, start: float, end: float, bounds: Optional[tuple] = None) -> Tuple[FlightStateTable, np.ndarray]:
+        """
+        State at ``end`` of every aircraft live at some point between
+        ``start`` and ``end`` (epoch seconds), as a table, plus the time each
+        row was recorded. That is the latest row recorded during a sighting
+        overlapping the window and at or before ``end``, which may predate
+        ``start`` for an aircraft that did not change. With ``bounds`` only
+        positions inside it count, and the scan starts from the grid cells
+        it overlaps.
+        """
+        where = "p.ts <= ? AND p.ts >= s.first_seen"
+        params = [start, end, end]
+        if bounds is not None:
+            min_lat, max_lat, min_lon, max_lon = bounds
+            where += " AND p.latitude BETWEEN ? AND ?"
+            params += [min_lat, max_lat]
+            if min_lon <= max_lon:
+                where += " AND p.longitude BETWEEN ? AND ?"
+            else:
+                where += " AND (p.longitude >= ? OR p.longitude <= ?)"
+            params += [min_lon, max_lon]
+            cells = cells_overlapping(bounds)
+            if len(cells) <= MAX_QUERY_CELLS:
+                where += f" AND p.cell IN ({', '.join('?' * len(cells))})"
+                params += cells
+
+        # SQLite returns the other columns from the row holding MAX(ts)
+        query = (
+            f"SELECT MAX(p.ts), {', '.join('p.' + c for c in COLUMNS[1:])} FROM positions p "
+            "JOIN sightings s ON s.icao24 = p.icao24 AND s.last_seen >= ? AND s.first_seen <= ? "
+            f"WHERE {where} GROUP BY p.icao24"
+        )
+        with self._connect() as conn:
+            records = conn.execute(query, params).fetchall()
+
+        builder = FlightStateBuilder()
+        recorded_at = []
+        names = COLUMNS[3:]
+        for record in records:
+            fields = dict(zip(names, record[3:]))
+            builder.append(icao24=record[1], **fields)
+            recorded_at.append(record[0])
+        return builder.build(None), np.array(recorded_at, dtype=np.float64)
+
+
+_flight_history: Optional[PositionHistory] = None
+_flight_history_lock = threading.Lock()
+
+def get_flight_history() -> Optional[PositionHistory]:
+    """
+    Shared PositionHistory, opened on first use; None when FLIGHT_HISTORY_DB is empty
+    """
+    global _flight_history
+    if _flight_history is None and HISTORY_DB:
+        with _flight_history_lock:
+            if _flight_history is None:
+                _flight_history = PositionHistory(os.path.join(os.path.dirname(os.path.abspath(__file__)), HISTORY_DB))
+    return _flight_history
@@ -1,8 +1,94 @@
+import asyncio
+import os
 import requests
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
+from circuit_breaker import CircuitBreaker, parse_retry_after
+from flight_state import FlightStateBuilder, FlightStateTable
+from http_client import USER_AGENT, upstream
+from json_backend import loads
+from metrics import UPSTREAM_ERRORS, UPSTREAM_RATE_LIMITED, timed
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+SOURCE_TIMEOUT = float(os.getenv("SCRAPER_SOURCE_TIMEOUT", "12"))
+FR24_STREAM_PARSE = os.getenv("FR24_STREAM_PARSE", "true").lower() == "true" and ijson is not None
+
+FLIGHTRADAR_URL = os.getenv("FR24_FEED_URL", "https://data-live.flightradar24.com/zones/fcgi/feed.js")
+FLIGHTRADAR_PARAMS = {
+    'bounds': '-44,-10,112,154',
+    'faa': '1',
+    'mlat': '1',
+    'flarm': '1',
+    'adsb': '1',
+    'gnd': '1',
+    'air': '1',
+    'vehicles': '1',
+    'estimated': '1',
+    'maxage': '7200',
+    'gliders': '1',
+    'stats': '1'
+}
+
+OPENSKY_URL = os.getenv("OPENSKY_STATES_URL", "https://opensky-network.org/api/states/all")
+OPENSKY_PARAMS = {
+    'lamin': -44.0,
+    'lamax': -10.0,
+    'lomin': 112.0,
+    'lomax': 154.0
+}
+
+flightradar_breaker = CircuitBreaker("flightradar24")
+opensky_breaker = CircuitBreaker("opensky")
+
+def _rate_limit_delay(response) -> Optional[float]:
+    """
+    Seconds to back off for a 429 response (OpenSky sends its own header), else None
+    """
+    if response is None or response.status_code != 429:
+        return None
+    headers = response.headers
+    delay = parse_retry_after(headers.get("X-Rate-Limit-Retry-After-Seconds") or headers.get("Retry-After"))
+    return delay if delay is not None else 0.0
+
+def _build_value(event: str, value, events: Iterator[Tuple]) -> object:
+    """
+    Assemble one JSON value from ijson events, starting at its first event
+    """
+    builder = ijson.ObjectBuilder()
+    builder.event(event, value)
+    depth = 1 if event in ("start_map", "start_array") else 0
+    while depth:
+        _, event, value = next(events)
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+    return builder.value
+
+
+def _iter_flightradar_records(events: Iterator[Tuple]) -> Iterator[Tuple[Optional[str], object]]:
+    """
+    (icao24, record) pairs from the 'aircraft' member of the feed, which is
+    either an object keyed by icao24 or a list of records. Only one record
+    is materialised at a time.
+    """
+    for prefix, event, value in events:
+        if prefix == "aircraft" and event == "map_key":
+            _, first_event, first_value = next(events)
+            yield value, _build_value(first_event, first_value, events)
+        elif prefix == "aircraft.item":
+            record = _build_value(event, value, events)
+            yield (record[0] if isinstance(record, list) and record else None), record
+
 
 class FlightDataFetcher:
     """
@@ -12,206 +98,262 @@ class FlightDataFetcher:
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': USER_AGENT
         })
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="flight-source")
         
-    def get_flightradar_data(self) -> List[Dict]:
+    def get_flightradar_data(self) -> FlightStateTable:
         """
         Fetch real flight data from FlightRadar24 public API
         """
+        if not flightradar_breaker.allow():
+            return FlightStateTable.empty()
         try:
-    
-            url = "https://data-live.flightradar24.com/zones/fcgi/feed.js"
-            params = {
-                'bounds': '-44,-10,112,154',
-                'faa': '1',
-                'mlat': '1',
-                'flarm': '1',
-                'adsb': '1',
-                'gnd': '1',
-                'air': '1',
-                'vehicles': '1',
-                'estimated': '1',
-                'maxage': '7200',
-                'gliders': '1',
-                'stats': '1'
-            }
-            
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            flights = []
-            
-    
-            aircraft_data = data.get('aircraft', {})
-            
-    
-            if isinstance(aircraft_data, dict):
-                for icao24, flight_data in aircraft_data.items():
-                    if isinstance(flight_data, list) and len(flight_data) >= 14:
-                        try:
-                            flight = {
-                                "icao24": icao24,
-                                "callsign": flight_data[16] if len(flight_data) > 16 else None,
-                                "latitude": flight_data[1],
-                                "longitude": flight_data[2],
-                                "altitude": flight_data[4],
-                                "velocity_kmh": round(flight_data[5] * 1.852, 2) if flight_data[5] else 0,
-                                "vertical_rate": flight_data[6],
-                                "on_ground": flight_data[8] == 1,
-                                "origin_country": "Australia",
-                                "destination_country": "Australia",
-                                "origin_airport": flight_data[11] if len(flight_data) > 11 else None,
-                                "destination_airport": flight_data[12] if len(flight_data) > 12 else None,
-                                "timestamp": datetime.utcnow().isoformat()
-                            }
-                            flights.append(flight)
-                        except (IndexError, TypeError):
-                            continue
-            elif isinstance(aircraft_data, list):
-        
-                for flight_data in aircraft_data:
-                    if isinstance(flight_data, list) and len(flight_data) >= 14:
-                        try:
-                            flight = {
-                                "icao24": flight_data[0] if len(flight_data) > 0 else None,
-                                "callsign": flight_data[16] if len(flight_data) > 16 else None,
-                                "latitude": flight_data[1],
-                                "longitude": flight_data[2],
-                                "altitude": flight_data[4],
-                                "velocity_kmh": round(flight_data[5] * 1.852, 2) if flight_data[5] else 0,
-                                "vertical_rate": flight_data[6],
-                                "on_ground": flight_data[8] == 1,
-                                "origin_country": "Australia",
-                                "destination_country": "Australia",
-                                "origin_airport": flight_data[11] if len(flight_data) > 11 else None,
-                                "destination_airport": flight_data[12] if len(flight_data) > 12 else None,
-                                "timestamp": datetime.utcnow().isoformat()
-                            }
-                            flights.append(flight)
-                        except (IndexError, TypeError):
-                            continue
-            
-            return flights
+            if FR24_STREAM_PARSE:
+                with timed("flightradar.stream"):
+                    table = self._stream_flightradar()
+            else:
+                with timed("flightradar.fetch"):
+                    response = self.session.get(FLIGHTRADAR_URL, params=FLIGHTRADAR_PARAMS, timeout=10)
+                response.raise_for_status()
+                with timed("flightradar.parse"):
+                    table = self._parse_flightradar(loads(response.content))
+            flightradar_breaker.record_success()
+            return table
             
         except Exception as e:
+            UPSTREAM_ERRORS.inc("flightradar24")
+            flightradar_breaker.record_failure(_rate_limit_delay(getattr(e, "response", None)))
             print(f"Error fetching FlightRadar24 data: {e}")
-            return []
+            return FlightStateTable.empty()
+
+    def _stream_flightradar(self) -> FlightStateTable:
+        """
+        Parse the feed while it downloads, appending each aircraft to the
+        table builder as soon as its record is complete. Neither the raw
+        body nor the parsed JSON tree is ever held in full.
+        """
+        builder = FlightStateBuilder()
+        with self.session.get(FLIGHTRADAR_URL, params=FLIGHTRADAR_PARAMS, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            events = ijson.parse(response.raw, use_float=True)
+            for icao24, flight_data in _iter_flightradar_records(events):
+                self._append_flightradar(builder, icao24, flight_data)
+        return builder.build(datetime.utcnow().isoformat())
+
+    def _parse_flightradar(self, data: Dict) -> FlightStateTable:
+        builder = FlightStateBuilder()
+        
+
+        aircraft_data = data.get('aircraft', {})
+        
+
+        if isinstance(aircraft_data, dict):
+            entries = aircraft_data.items()
+        elif isinstance(aircraft_data, list):
+            entries = ((flight_data[0] if flight_data else None, flight_data) for flight_data in aircraft_data)
+        else:
+            entries = ()
+
+        for icao24, flight_data in entries:
+            self._append_flightradar(builder, icao24, flight_data)
+        
+        return builder.build(datetime.utcnow().isoformat())
     
-    def get_opensky_data(self) -> List[Dict]:
+    def _append_flightradar(self, builder: FlightStateBuilder, icao24: Optional[str], flight_data) -> None:
+        if isinstance(flight_data, list) and len(flight_data) >= 14:
+            try:
+                builder.append(
+                    icao24=icao24,
+                    callsign=flight_data[16] if len(flight_data) > 16 else None,
+                    latitude=flight_data[1],
+                    longitude=flight_data[2],
+                    altitude=flight_data[4],
+                    velocity_kmh=round(flight_data[5] * 1.852, 2) if flight_data[5] else 0,
+                    vertical_rate=flight_data[6],
+                    on_ground=flight_data[8] == 1,
+                    origin_country="Australia",
+                    destination_country="Australia",
+                    origin_airport=flight_data[11] if len(flight_data) > 11 else None,
+                    destination_airport=flight_data[12] if len(flight_data) > 12 else None
+                )
+            except (IndexError, TypeError):
+                pass
+
+    def get_opensky_data(self) -> FlightStateTable:
         """
         Fetch real flight data from OpenSky Network API
         """
+        if not opensky_breaker.allow():
+            return FlightStateTable.empty()
         try:
-    
-            url = "https://opensky-network.org/api/states/all"
-            params = {
-                'lamin': -44.0,
-                'lamax': -10.0,
-                'lomin': 112.0,
-                'lomax': 154.0
-            }
-            
-    
-            auth = None
-            username = "your_opensky_username"
-            password = "your_opensky_password"
-            
-            if username != "your_opensky_username" and password != "your_opensky_password":
-                auth = (username, password)
-            
-            response = self.session.get(url, params=params, auth=auth, timeout=10)
+            with timed("opensky.fetch"):
+                response = self.session.get(OPENSKY_URL, params=OPENSKY_PARAMS, auth=self._opensky_auth(), timeout=10)
             
     
             if response.status_code == 429:
+                UPSTREAM_RATE_LIMITED.inc("opensky")
+                opensky_breaker.record_failure(_rate_limit_delay(response))
                 print("OpenSky API rate limited, skipping...")
-                return []
+                return FlightStateTable.empty()
             
             response.raise_for_status()
-            
-            data = response.json()
-            flights = []
-            
-            for state in data.get('states', []):
-                if len(state) >= 17:
-                    try:
-                        flight = {
-                            "icao24": state[0],
-                            "callsign": state[1].strip() if state[1] else None,
-                            "origin_country": state[2],
-                            "timestamp": state[3],
-                            "longitude": state[5],
-                            "latitude": state[6],
-                            "altitude": state[7],
-                            "velocity_kmh": state[9] * 3.6 if state[9] else 0,
-                            "vertical_rate": state[11],
-                            "on_ground": state[8],
-                            "origin_airport": None,
-                            "destination_airport": None,
-                            "timestamp": datetime.utcnow().isoformat()
-                        }
-                        flights.append(flight)
-                    except (IndexError, TypeError):
-                        continue
-            
-            return flights
+            with timed("opensky.parse"):
+                table = self._parse_opensky(loads(response.content))
+            opensky_breaker.record_success()
+            return table
             
         except Exception as e:
+            UPSTREAM_ERRORS.inc("opensky")
+            opensky_breaker.record_failure()
             print(f"Error fetching OpenSky data: {e}")
-            return []
-    
-    def get_all_real_flight_data(self) -> List[Dict]:
+            return FlightStateTable.empty()
+
+    def _opensky_auth(self) -> Optional[tuple]:
+        auth = None
+        username = "your_opensky_username"
+        password = "your_opensky_password"
+        
+        if username != "your_opensky_username" and password != "your_opensky_password":
+            auth = (username, password)
+        return auth
+
+    def _parse_opensky(self, data: Dict) -> FlightStateTable:
+        builder = FlightStateBuilder()
+        
+        for state in data.get('states') or []:
+            if len(state) >= 17:
+                try:
+                    builder.append(
+                        icao24=state[0],
+                        callsign=state[1].strip() if state[1] else None,
+                        origin_country=state[2],
+                        longitude=state[5],
+                        latitude=state[6],
+                        altitude=state[7],
+                        velocity_kmh=state[9] * 3.6 if state[9] else 0,
+                        vertical_rate=state[11],
+                        on_ground=state[8]
+                    )
+                except (IndexError, TypeError):
+                    continue
+        
+        return builder.build(datetime.utcnow().isoformat())
+
+    async def get_flightradar_data_async(self) -> FlightStateTable:
         """
-        Combine real data from legitimate sources only
+        get_flightradar_data on the shared async HTTP client
         """
-        all_flights = []
-        
+        if not flightradar_breaker.allow():
+            return FlightStateTable.empty()
+        try:
+            with timed("flightradar.fetch"):
+                response = await upstream.client.get(FLIGHTRADAR_URL, params=FLIGHTRADAR_PARAMS)
+            response.raise_for_status()
+            with timed("flightradar.parse"):
+                table = self._parse_flightradar(loads(response.content))
+            flightradar_breaker.record_success()
+            return table
+        except Exception as e:
+            UPSTREAM_ERRORS.inc("flightradar24")
+            flightradar_breaker.record_failure(_rate_limit_delay(getattr(e, "response", None)))
+            print(f"Error fetching FlightRadar24 data: {e}")
+            return FlightStateTable.empty()
 
+    async def get_opensky_data_async(self) -> FlightStateTable:
+        """
+        get_opensky_data on the shared async HTTP client
+        """
+        if not opensky_breaker.allow():
+            return FlightStateTable.empty()
+        try:
+            with timed("opensky.fetch"):
+                response = await upstream.client.get(OPENSKY_URL, params=OPENSKY_PARAMS, auth=self._opensky_auth())
+            if response.status_code == 429:
+                UPSTREAM_RATE_LIMITED.inc("opensky")
+                opensky_breaker.record_failure(_rate_limit_delay(response))
+                print("OpenSky API rate limited, skipping...")
+                return FlightStateTable.empty()
+            response.raise_for_status()
+            with timed("opensky.parse"):
+                table = self._parse_opensky(loads(response.content))
+            opensky_breaker.record_success()
+            return table
+        except Exception as e:
+            UPSTREAM_ERRORS.inc("opensky")
+            opensky_breaker.record_failure()
+            print(f"Error fetching OpenSky data: {e}")
+            return FlightStateTable.empty()
+    
+    def get_all_real_flight_data(self, concurrent: bool = True, source_timeout: float = SOURCE_TIMEOUT) -> FlightStateTable:
+        """
+        Combine real data from legitimate sources only.
+
+        By default all sources are fetched concurrently and each one gets
+        ``source_timeout`` seconds; a source that is slow, rate limited or
+        behind an open circuit breaker is left out and the others are still
+        returned.
+        """
         sources = [
             self.get_flightradar_data,
             self.get_opensky_data
         ]
-        
-        for source_func in sources:
+
+        if concurrent:
+            results = self._fetch_concurrently(sources, source_timeout)
+        else:
+            results = []
+            for source_func in sources:
+                try:
+                    results.append(source_func())
+                except Exception as e:
+                    print(f"Error with data source {source_func.__name__}: {e}")
+                    results.append(FlightStateTable.empty())
+
+        with timed("scraper.merge"):
+            return FlightStateTable.concat_unique(results, timestamp=datetime.utcnow().isoformat())
+
+    def _fetch_concurrently(self, sources: list, source_timeout: float) -> List[FlightStateTable]:
+        """
+        Run every source on the shared pool and collect what finishes in time.
+        Results keep the order of ``sources`` so de-duplication priority is stable.
+        """
+        futures = [(source_func, self._executor.submit(source_func)) for source_func in sources]
+        deadline = time.monotonic() + source_timeout
+
+        results = []
+        for source_func, future in futures:
             try:
-                flights = source_func()
-                all_flights.extend(flights)
-                time.sleep(1)
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                print(f"Data source {source_func.__name__} missed its {source_timeout}s deadline, skipping...")
+                results.append(FlightStateTable.empty())
             except Exception as e:
                 print(f"Error with data source {source_func.__name__}: {e}")
-                continue
-        
+                results.append(FlightStateTable.empty())
+        return results
 
-        unique_flights = {}
-        for flight in all_flights:
-            icao24 = flight.get("icao24")
-            if icao24 and icao24 not in unique_flights:
-                unique_flights[icao24] = flight
-        
-        return list(unique_flights.values())
-    
-    def get_flights_by_region(self, bounds: tuple = (-44.0, -10.0, 112.0, 154.0)) -> List[Dict]:
+    async def get_all_real_flight_data_async(self, source_timeout: float = SOURCE_TIMEOUT) -> FlightStateTable:
         """
-        Get real flights within specific geographic bounds
+        get_all_real_flight_data with every source awaited concurrently on
+        the shared event loop, each under its own ``source_timeout`` deadline
         """
-        all_flights = self.get_all_real_flight_data()
-        min_lat, max_lat, min_lon, max_lon = bounds
-        
-        filtered_flights = []
-        for flight in all_flights:
-            lat = flight.get("latitude")
-            lon = flight.get("longitude")
-            
-            if lat is not None and lon is not None:
-                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
-                    filtered_flights.append(flight)
-        
-        return filtered_flights
-flight_fetcher = FlightDataFetcher()
+        sources = [
+            self.get_flightradar_data_async,
+            self.get_opensky_data_async
+        ]
 
-def get_scraped_flights(bounds: tuple = (-44.0, -10.0, 112.0, 154.0)) -> List[Dict]:
-    """
-    Main function to get real flight data
-    """
-    return flight_fetcher.get_flights_by_region(bounds) 
\ No newline at end of file
+        async def with_deadline(source_func):
+            try:
+                return await asyncio.wait_for(source_func(), timeout=source_timeout)
+            except asyncio.TimeoutError:
+                print(f"Data source {source_func.__name__} missed its {source_timeout}s deadline, skipping...")
+                return FlightStateTable.empty()
+
+        results = await asyncio.gather(*(with_deadline(source_func) for source_func in sources))
+        with timed("scraper.merge"):
+            return FlightStateTable.concat_unique(results, timestamp=datetime.utcnow().isoformat())
+
+
+flight_fetcher = FlightDataFetcher()
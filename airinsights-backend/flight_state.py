@@ -0,0 +1,297 @@
+import math
+import os
+from array import array
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+import numpy as np
+from cache import LRUCache
+
+NUMERIC_COLUMNS = ("latitude", "longitude", "altitude", "velocity_kmh", "vertical_rate")
+STRING_COLUMNS = ("callsign", "origin_country", "destination_country", "origin_airport", "destination_airport")
+
+# Match tables memoized per pool; each one is a bool per distinct string
+STRING_MATCH_CACHE_SIZE = int(os.getenv("STRING_MATCH_CACHE_SIZE", "64"))
+
+# Key order of the JSON rows returned by the API
+ROW_KEYS = (
+    "icao24", "callsign", "latitude", "longitude", "altitude", "velocity_kmh", "vertical_rate",
+    "on_ground", "origin_country", "destination_country", "origin_airport", "destination_airport", "timestamp"
+)
+
+
+def _to_float(value) -> float:
+    if value is None or value == "":
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class StringPool:
+    """
+    Interns repeated strings (callsigns, countries, airports) as small integer codes.
+    Code 0 is reserved for None.
+    """
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self._codes: Dict[Optional[str], int] = {None: 0}
+        self._matches = LRUCache(max_size=STRING_MATCH_CACHE_SIZE, name="string_match")
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def code(self, value: Optional[str]) -> int:
+        if value == "":
+            value = None
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: Optional[str]) -> Optional[int]:
+        return self._codes.get(value)
+
+    def match_table(self, key: Hashable, matches: Callable[[str], bool]) -> np.ndarray:
+        """
+        Boolean lookup indexed by code, True where ``matches`` accepts the value.
+        The most recent STRING_MATCH_CACHE_SIZE tables are memoized under
+        ``key`` so repeated queries skip the string checks.
+        """
+        lookup = self._matches.get(key)
+        if lookup is None:
+            lookup = np.array([value is not None and matches(value) for value in self.values], dtype=bool)
+            self._matches.set(key, lookup)
+        return lookup
+
+    def decode(self, codes: np.ndarray) -> List[Optional[str]]:
+        values = self.values
+        return [values[c] for c in codes.tolist()]
+
+
+class FlightStateBuilder:
+    """
+    Accumulates aircraft one at a time and freezes them into a FlightStateTable.
+    Columns grow as typed arrays, so each aircraft costs a few dozen bytes
+    rather than a row of Python objects.
+    """
+
+    def __init__(self):
+        self.pool = StringPool()
+        self._icao24: List[str] = []
+        self._numeric: Dict[str, array] = {name: array("d") for name in NUMERIC_COLUMNS}
+        self._strings: Dict[str, array] = {name: array("i") for name in STRING_COLUMNS}
+        self._on_ground = array("b")
+
+    def __len__(self) -> int:
+        return len(self._icao24)
+
+    def append(self, icao24: str, on_ground: bool = False, **fields) -> None:
+        if not icao24:
+            return
+        self._icao24.append(icao24)
+        self._on_ground.append(bool(on_ground))
+        for name in NUMERIC_COLUMNS:
+            self._numeric[name].append(_to_float(fields.get(name)))
+        code = self.pool.code
+        for name in STRING_COLUMNS:
+            self._strings[name].append(code(fields.get(name)))
+
+    def build(self, timestamp: Optional[str]) -> "FlightStateTable":
+        return FlightStateTable(
+            icao24=np.array(self._icao24, dtype=object),
+            numeric={name: np.frombuffer(values, dtype=np.float64).copy() for name, values in self._numeric.items()},
+            strings={name: np.frombuffer(codes, dtype=np.int32).copy() for name, codes in self._strings.items()},
+            on_ground=np.frombuffer(self._on_ground, dtype=np.int8).astype(bool),
+            pool=self.pool,
+            timestamp=timestamp
+        )
+
+
+class FlightStateTable:
+    """
+    Columnar store of aircraft states.
+
+    Positions and kinematics are parallel float arrays (NaN when unknown),
+    string fields are int32 codes into a shared StringPool, and the whole
+    table carries a single snapshot timestamp. JSON rows are only built on
+    demand by to_rows/iter_rows.
+    """
+
+    def __init__(self, icao24: np.ndarray, numeric: Dict[str, np.ndarray], strings: Dict[str, np.ndarray],
+                 on_ground: np.ndarray, pool: StringPool, timestamp: Optional[str]):
+        self.icao24 = icao24
+        self.numeric = numeric
+        self.strings = strings
+        self.on_ground = on_ground
+        self.pool = pool
+        self.timestamp = timestamp
+
+    @classmethod
+    def empty(cls, timestamp: Optional[str] = None) -> "FlightStateTable":
+        return FlightStateBuilder().build(timestamp)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], timestamp: Optional[str] = None) -> "FlightStateTable":
+        builder = FlightStateBuilder()
+        for row in rows:
+            builder.append(**row)
+        return builder.build(timestamp)
+
+    def __len__(self) -> int:
+        return len(self.icao24)
+
+    def take(self, indices: np.ndarray) -> "FlightStateTable":
+        """
+        New table holding the rows at ``indices`` (or a boolean mask), sharing the pool
+        """
+        return FlightStateTable(
+            icao24=self.icao24[indices],
+            numeric={name: values[indices] for name, values in self.numeric.items()},
+            strings={name: codes[indices] for name, codes in self.strings.items()},
+            on_ground=self.on_ground[indices],
+            pool=self.pool,
+            timestamp=self.timestamp
+        )
+
+    @classmethod
+    def concat(cls, tables: Sequence["FlightStateTable"], timestamp: Optional[str]) -> "FlightStateTable":
+        """
+        Concatenate tables into one with a merged string pool
+        """
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls.empty(timestamp)
+
+        pool = StringPool()
+        remapped = []
+        for table in tables:
+            # Translate each table's codes into the merged pool with one lookup per distinct string
+            mapping = np.array([pool.code(value) for value in table.pool.values], dtype=np.int32)
+            remapped.append({name: mapping[codes] for name, codes in table.strings.items()})
+
+        return FlightStateTable(
+            icao24=np.concatenate([t.icao24 for t in tables]),
+            numeric={name: np.concatenate([t.numeric[name] for t in tables]) for name in NUMERIC_COLUMNS},
+            strings={name: np.concatenate([r[name] for r in remapped]) for name in STRING_COLUMNS},
+            on_ground=np.concatenate([t.on_ground for t in tables]),
+            pool=pool,
+            timestamp=timestamp
+        )
+
+    @classmethod
+    def concat_unique(cls, tables: Sequence["FlightStateTable"], timestamp: Optional[str]) -> "FlightStateTable":
+        """
+        Concatenate tables keeping the first row seen for each icao24
+        """
+        merged = cls.concat(tables, timestamp)
+        _, first = np.unique(merged.icao24.astype(str), return_index=True)
+        return merged.take(np.sort(first))
+
+    def iter_rows(self, indices: Optional[np.ndarray] = None) -> Iterator[Dict]:
+        """
+        Lazily build JSON-ready dicts, optionally only for ``indices``
+        """
+        table = self if indices is None else self.take(indices)
+        columns = [table.icao24.tolist(), table.pool.decode(table.strings["callsign"])]
+        for name in NUMERIC_COLUMNS:
+            columns.append([None if math.isnan(v) else v for v in table.numeric[name].tolist()])
+        columns.append(table.on_ground.tolist())
+        for name in STRING_COLUMNS[1:]:
+            columns.append(table.pool.decode(table.strings[name]))
+        timestamp = table.timestamp
+        for values in zip(*columns):
+            row = dict(zip(ROW_KEYS, values))
+            row["timestamp"] = timestamp
+            yield row
+
+    def to_rows(self, indices: Optional[np.ndarray] = None) -> List[Dict]:
+        return list(self.iter_rows(indices))
+
+
+class ChangeSet(NamedTuple):
+    """
+    What changed between two consecutive tables: row indices into the newer
+    table for aircraft that appeared or changed, and the icao24s that disappeared
+    """
+    added: np.ndarray
+    updated: np.ndarray
+    removed: List[str]
+
+    @classmethod
+    def empty(cls) -> "ChangeSet":
+        return cls(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), [])
+
+
+def _match_ids(known: np.ndarray, ids: np.ndarray):
+    """
+    For each of ``ids``, its row in ``known`` and whether it was found there
+    """
+    if not len(known):
+        return np.zeros(len(ids), dtype=np.intp), np.zeros(len(ids), dtype=bool)
+    order = np.argsort(known)
+    positions = np.minimum(np.searchsorted(known, ids, sorter=order), len(order) - 1)
+    matched = order[positions]
+    return matched, known[matched] == ids
+
+
+def _changed(current: FlightStateTable, rows: np.ndarray, previous: FlightStateTable, before: np.ndarray) -> np.ndarray:
+    """
+    True where ``current[rows]`` differs in any column from ``previous[before]``
+    """
+    changed = current.on_ground[rows] != previous.on_ground[before]
+    for name in NUMERIC_COLUMNS:
+        new, old = current.numeric[name][rows], previous.numeric[name][before]
+        changed |= ~((new == old) | (np.isnan(new) & np.isnan(old)))
+    # Translate the old pool's codes into the new pool so strings compare as ints
+    codes = [current.pool.lookup(value) for value in previous.pool.values]
+    mapping = np.array([-1 if code is None else code for code in codes], dtype=np.int32)
+    for name in STRING_COLUMNS:
+        changed |= current.strings[name][rows] != mapping[previous.strings[name][before]]
+    return changed
+
+
+class FlightStateManager:
+    """
+    Running aircraft state keyed by icao24, updated one poll at a time.
+
+    Each poll is merged into the previous state instead of replacing it:
+    aircraft missing from a poll (e.g. one source was rate limited) are
+    kept until they have not been seen for ``stale_after`` seconds. Every
+    merge returns a ChangeSet so downstream consumers only touch the rows
+    that actually changed.
+    """
+
+    def __init__(self, stale_after: float):
+        self.stale_after = stale_after
+        self.table = FlightStateTable.empty()
+        self.last_seen = np.empty(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def merge(self, incoming: FlightStateTable, now: float) -> ChangeSet:
+        """
+        Fold a poll into the state and return what changed. In the new
+        ``table`` the polled aircraft come first, in ``incoming`` order, so
+        ChangeSet row indices are also indices into ``incoming``.
+        """
+        known = self.table.icao24.astype(str)
+        matched, found = _match_ids(known, incoming.icao24.astype(str))
+
+        seen = np.zeros(len(known), dtype=bool)
+        seen[matched[found]] = True
+        expired = ~seen & (now - self.last_seen > self.stale_after)
+        kept = np.flatnonzero(~seen & ~expired)
+
+        rows = np.flatnonzero(found)
+        changes = ChangeSet(
+            added=np.flatnonzero(~found),
+            updated=rows[_changed(incoming, rows, self.table, matched[found])],
+            removed=known[expired].tolist()
+        )
+
+        self.table = FlightStateTable.concat([incoming, self.table.take(kept)], timestamp=incoming.timestamp)
+        self.last_seen = np.concatenate([np.full(len(incoming), now), self.last_seen[kept]])
+        return changes
@@ -1,24 +1,77 @@
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
+from cache import LRUCache, SQLiteCache, content_hash
+from llm_client import llm_client
+from prompt_builder import build_insights_prompt
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+INSIGHTS_CACHE_SIZE = int(os.getenv("INSIGHTS_CACHE_SIZE", "256"))
+INSIGHTS_CACHE_TTL = float(os.getenv("INSIGHTS_CACHE_TTL", "3600"))
+INSIGHTS_CACHE_DB = os.getenv("INSIGHTS_CACHE_DB", "")
+
+insights_cache = LRUCache(max_size=INSIGHTS_CACHE_SIZE, ttl=INSIGHTS_CACHE_TTL, name="insights")
+insights_disk_cache = SQLiteCache(INSIGHTS_CACHE_DB, ttl=INSIGHTS_CACHE_TTL) if INSIGHTS_CACHE_DB else None
+
+def get_cached_insights(key):
+    """
+    Cached insight text for a content hash, checking memory then disk
+    """
+    insights = insights_cache.get(key)
+    if insights is None and insights_disk_cache is not None:
+        insights = insights_disk_cache.get(key)
+        if insights is not None:
+            insights_cache.set(key, insights)
+    return insights
+
+def store_insights(key, insights):
+    insights_cache.set(key, insights)
+    if insights_disk_cache is not None:
+        insights_disk_cache.set(key, insights)
 
 def analyze_with_gemini(flight_data):
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    prompt = f"""You are a data analyst for an airline company.
+    key = content_hash(flight_data)
+    cached = get_cached_insights(key)
+    if cached is not None:
+        return cached
+
+    prompt = build_insights_prompt(flight_data)
+    insights = llm_client.generate(prompt, key=key)
+    store_insights(key, insights)
+    return insights
+
+async def analyze_with_gemini_async(flight_data):
+    """
+    analyze_with_gemini for the async upstream mode; run it on the upstream loop
+    """
+    key = content_hash(flight_data)
+    cached = get_cached_insights(key)
+    if cached is not None:
+        return cached
+
+    prompt = build_insights_prompt(flight_data)
+    insights = await llm_client.generate_async(prompt, key=key)
+    store_insights(key, insights)
+    return insights
 
-Here is the flight dataset:
-{flight_data}
+def stream_with_gemini(flight_data):
+    """
+    Yield insight text chunks as Gemini generates them.
 
-Generate insights including:
-- Most common routes
-- Time patterns (peak hours or days)
-- Status trends (delayed, scheduled, etc.)
-- Anomalies or demand spikes
+    A cached result is yielded as a single chunk. The full text is cached
+    once the stream completes; if the consumer stops early (client
+    disconnected) the generator is closed, iteration of the upstream stream
+    stops and nothing is cached.
+    """
+    key = content_hash(flight_data)
+    cached = get_cached_insights(key)
+    if cached is not None:
+        yield cached
+        return
 
-Keep it short and business-friendly."""
+    prompt = build_insights_prompt(flight_data)
 
-    response = model.generate_content(prompt)
-    return response.text
+    chunks = []
+    for text in llm_client.stream(prompt):
+        chunks.append(text)
+        yield text
+    store_insights(key, "".join(chunks))
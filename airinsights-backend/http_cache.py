@@ -0,0 +1,76 @@
+import gzip
+import hashlib
+import os
+from typing import Any, Callable, Hashable, Optional
+from flask import Response, current_app, request
+from cache import LRUCache
+from json_backend import RESPONSE_CACHE_SIZE, cached_json_body
+from metrics import timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("HTTP_COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("HTTP_BROTLI_QUALITY", "5"))
+# 0 makes clients revalidate every time, which costs a 304 while data is unchanged
+CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+compressed_cache = LRUCache(max_size=RESPONSE_CACHE_SIZE, name="compressed_response")
+
+
+def make_etag(key: Hashable, version: Hashable) -> str:
+    """
+    Opaque tag for one resource at one data version. Versions should include
+    a wall-clock part (snapshot or fetch time) so tags from different worker
+    processes never collide.
+    """
+    return hashlib.blake2b(repr((key, version)).encode(), digest_size=12).hexdigest()
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    with timed("compress"):
+        if encoding == "br":
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+def _negotiate() -> Optional[str]:
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def _cache_headers(response: Response, etag: str) -> Response:
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = f"public, max-age={CACHE_MAX_AGE}" if CACHE_MAX_AGE > 0 else "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def conditional_json_response(key: Hashable, version: Hashable, build: Callable[[], Any]) -> Response:
+    """
+    JSON response for ``key`` at data ``version``, with a weak ETag and
+    Cache-Control. A matching If-None-Match gets an empty 304 without
+    building anything. Otherwise the body is encoded once per version and
+    compressed once per version and encoding, whatever the number of clients.
+    """
+    etag = make_etag(key, version)
+    if request.if_none_match.contains_weak(etag):
+        return _cache_headers(current_app.response_class(status=304), etag)
+
+    body = cached_json_body((key, version), build)
+    encoding = _negotiate() if len(body) >= COMPRESS_MIN_SIZE else None
+    if encoding is not None:
+        compressed = compressed_cache.get((key, version, encoding))
+        if compressed is None:
+            compressed = _compress(body, encoding)
+            compressed_cache.set((key, version, encoding), compressed)
+        body = compressed
+
+    response = current_app.response_class(body, mimetype="application/json")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    return _cache_headers(response, etag)
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Optional
+import httpx
+
+ASYNC_UPSTREAM = os.getenv("ASYNC_UPSTREAM", "false").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class AsyncUpstream:
+    """
+    One event loop thread and one pooled httpx.AsyncClient per process.
+
+    Every async upstream call (AviationStack, FlightRadar24, OpenSky, Gemini)
+    runs on this loop, so hundreds of in-flight requests share one thread and
+    one connection pool. Sync code hands coroutines over with ``run`` (or
+    ``submit`` for a Future).
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        # Created lazily so each gunicorn worker starts its own loop after fork
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="async-upstream", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Shared client; only use it from coroutines running on ``loop``
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+                timeout=10
+            )
+        return self._client
+
+    def submit(self, coro: Awaitable) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the shared loop and block until it finishes
+        """
+        return self.submit(coro).result(timeout)
+
+
+upstream = AsyncUpstream()
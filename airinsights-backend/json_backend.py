@@ -0,0 +1,85 @@
+import json
+import os
+from typing import Any, Callable, Hashable
+from flask import Response, current_app
+from flask.json.provider import DefaultJSONProvider
+from cache import LRUCache
+from metrics import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RESPONSE_CACHE_SIZE = int(os.getenv("JSON_RESPONSE_CACHE_SIZE", "128"))
+
+if orjson is not None:
+    # Keys are sorted like Flask's default provider, but unlike Flask non-ASCII
+    # text is written as raw UTF-8 instead of \u escapes: orjson has no ASCII
+    # mode, and the json fallback matches it so bodies do not depend on which
+    # encoder is installed
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def loads(data) -> Any:
+    """
+    Decode JSON from bytes or str, with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, default: Callable = DefaultJSONProvider.default, indent: bool = False) -> bytes:
+    """
+    Compact UTF-8 JSON bytes with sorted keys and unescaped non-ASCII text.
+    ``default`` handles types the encoder does not (datetimes use Flask's
+    HTTP date format).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    separators = None if indent else (",", ":")
+    return json.dumps(obj, default=default, sort_keys=True, ensure_ascii=False,
+                      indent=2 if indent else None, separators=separators).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by ``dumps``/``loads``; responses are built
+    from bytes without an intermediate str
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj, default=kwargs.pop("default", self.default)).decode()
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        with timed("serialize"):
+            body = dumps(obj, default=self.default, indent=indent) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+response_cache = LRUCache(max_size=RESPONSE_CACHE_SIZE, name="json_response")
+
+def cached_json_body(key: Hashable, build: Callable[[], Any]) -> bytes:
+    """
+    Encoded JSON body cached under ``key``; ``build`` only runs on a miss.
+    Include the snapshot version in the key so a new snapshot never serves an old body.
+    """
+    body = response_cache.get(key)
+    if body is None:
+        data = build()
+        with timed("serialize"):
+            body = dumps(data) + b"\n"
+        response_cache.set(key, body)
+    return body
+
+def cached_json_response(key: Hashable, build: Callable[[], Any]) -> Response:
+    """
+    JSON response whose encoded body is cached under ``key``
+    """
+    return current_app.response_class(cached_json_body(key, build), mimetype="application/json")
@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+import numpy as np
+from flight_scraper import flight_fetcher
+from flight_filters import FlightFilter
+from flight_history import PositionHistory, get_flight_history
+from flight_state import ChangeSet, FlightStateManager, FlightStateTable
+from http_client import ASYNC_UPSTREAM, upstream
+from metrics import timed
+from spatial_index import GridIndex, SpatialQuery
+
+POLL_INTERVAL = float(os.getenv("SCRAPER_POLL_INTERVAL", "30"))
+FIRST_SNAPSHOT_TIMEOUT = float(os.getenv("SCRAPER_FIRST_SNAPSHOT_TIMEOUT", "15"))
+STALE_AFTER = float(os.getenv("SCRAPER_STALE_AFTER", "90"))
+LIVE_KEEPALIVE = float(os.getenv("LIVE_STREAM_KEEPALIVE", "15"))
+# Each open stream holds a server thread; keep some free for ordinary requests
+LIVE_MAX_STREAMS = int(os.getenv("LIVE_MAX_STREAMS", "16"))
+# Streams end after this long and EventSource clients reconnect, so threads
+# stuck on clients that vanished without a disconnect are eventually freed
+LIVE_MAX_DURATION = float(os.getenv("LIVE_STREAM_MAX_DURATION", "600"))
+
+DEFAULT_BOUNDS = (-44.0, -10.0, 112.0, 154.0)
+
+
+class TrafficSnapshot(NamedTuple):
+    """
+    Immutable view of the merged FlightRadar24/OpenSky traffic at one poll
+    """
+    version: int
+    timestamp: Optional[str]
+    table: FlightStateTable
+    index: GridIndex
+    changes: ChangeSet
+
+    def flights_in_region(self, bounds: tuple = DEFAULT_BOUNDS) -> FlightStateTable:
+        """
+        Flights within (min_lat, max_lat, min_lon, max_lon)
+        """
+        return self.table.take(self.index.query_bounds(bounds))
+
+    def select(self, query: Optional[SpatialQuery] = None) -> FlightStateTable:
+        """
+        Flights matching a viewport query, defaulting to the polled region
+        """
+        if query is None:
+            return self.flights_in_region()
+        return self.table.take(self.index.select(query))
+
+
+EMPTY_SNAPSHOT = TrafficSnapshot(0, None, FlightStateTable.empty(), GridIndex(FlightStateTable.empty()), ChangeSet.empty())
+
+
+class TrafficPoller:
+    """
+    Background thread that refreshes live traffic on a fixed cadence and
+    publishes each result as a new TrafficSnapshot. Request handlers only
+    read the current snapshot, so upstream traffic does not grow with
+    client traffic.
+    """
+
+    def __init__(self, fetcher=flight_fetcher, interval: float = POLL_INTERVAL, stale_after: float = STALE_AFTER,
+                 history: Optional[PositionHistory] = None):
+        self.fetcher = fetcher
+        # None records to the shared history from get_flight_history()
+        self.history = history
+        self.interval = interval
+        self.state = FlightStateManager(stale_after)
+        self._snapshot = EMPTY_SNAPSHOT
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._updated = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        # Started lazily so each gunicorn worker runs its own poller after fork
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="traffic-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            self.poll_once()
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def poll_once(self) -> TrafficSnapshot:
+        try:
+            with timed("traffic.poll"):
+                if ASYNC_UPSTREAM:
+                    table = upstream.run(self.fetcher.get_all_real_flight_data_async())
+                else:
+                    table = self.fetcher.get_all_real_flight_data()
+        except Exception as e:
+            print(f"Error polling live traffic: {e}")
+            table = None
+
+        if table is not None and len(table):
+            self._publish(table)
+        elif not self._ready.is_set():
+            # Let waiting requests fail fast instead of blocking until the next poll
+            self._ready.set()
+        return self._snapshot
+
+    def _publish(self, table: FlightStateTable) -> None:
+        now = time.time()
+        with timed("traffic.publish"):
+            changes = self.state.merge(table, now)
+            snapshot = TrafficSnapshot(
+                version=self._snapshot.version + 1,
+                timestamp=datetime.utcnow().isoformat() + "Z",
+                table=self.state.table,
+                index=GridIndex(self.state.table),
+                changes=changes
+            )
+        with self._updated:
+            self._snapshot = snapshot
+            self._updated.notify_all()
+        self._ready.set()
+
+        history = self.history if self.history is not None else get_flight_history()
+        if history is not None:
+            try:
+                history.record(snapshot.table, changes, now)
+            except Exception as e:
+                print(f"Error recording position history: {e}")
+
+    def snapshot(self, wait: float = FIRST_SNAPSHOT_TIMEOUT) -> TrafficSnapshot:
+        """
+        Current snapshot, starting the poller and waiting for the first poll if needed
+        """
+        self.start()
+        if not self._ready.is_set():
+            self._ready.wait(wait)
+        return self._snapshot
+
+    def wait_for_update(self, version: int, timeout: float) -> TrafficSnapshot:
+        """
+        Block until a snapshot newer than ``version`` is published or ``timeout``
+        passes, then return the current snapshot
+        """
+        self.start()
+        with self._updated:
+            self._updated.wait_for(lambda: self._snapshot.version > version, timeout)
+            return self._snapshot
+
+
+class LiveSubscription:
+    """
+    One /flights/live client: its viewport and filter, plus the set of
+    aircraft it has been sent. After the initial full state only the rows
+    in each snapshot's ChangeSet are re-checked, so the work per update
+    scales with the number of changes rather than the fleet size.
+    """
+
+    def __init__(self, query: Optional[SpatialQuery] = None, flight_filter: Optional[FlightFilter] = None):
+        self.query = query or SpatialQuery(bounds=DEFAULT_BOUNDS)
+        self.flight_filter = flight_filter or FlightFilter()
+        self.version = 0
+        self.visible = set()
+
+    def full(self, snapshot: TrafficSnapshot) -> Dict:
+        flights = snapshot.select(self.query)
+        flights = flights.take(self.flight_filter.apply(flights))
+        self.version = snapshot.version
+        self.visible = set(flights.icao24.tolist())
+        return {
+            "version": snapshot.version,
+            "timestamp": snapshot.timestamp,
+            "flights": flights.to_rows()
+        }
+
+    def delta(self, snapshot: TrafficSnapshot) -> Optional[Dict]:
+        """
+        Changes relevant to this client since the previous snapshot, or None
+        if none of them touch its view. Aircraft that leave the viewport or
+        stop matching the filter are reported as removed.
+        """
+        changes = snapshot.changes
+        candidates = snapshot.table.take(np.concatenate([changes.added, changes.updated]))
+        matched = self.query.mask(candidates) & self.flight_filter.mask(candidates)
+
+        added, updated, removed = [], [], []
+        for row, (icao24, match) in enumerate(zip(candidates.icao24.tolist(), matched.tolist())):
+            if match:
+                (updated if icao24 in self.visible else added).append(row)
+                self.visible.add(icao24)
+            elif icao24 in self.visible:
+                self.visible.discard(icao24)
+                removed.append(icao24)
+        for icao24 in changes.removed:
+            if icao24 in self.visible:
+                self.visible.discard(icao24)
+                removed.append(icao24)
+
+        self.version = snapshot.version
+        if not (added or updated or removed):
+            return None
+        return {
+            "version": snapshot.version,
+            "timestamp": snapshot.timestamp,
+            "added": candidates.to_rows(np.array(added, dtype=np.intp)),
+            "updated": candidates.to_rows(np.array(updated, dtype=np.intp)),
+            "removed": removed
+        }
+
+
+traffic_poller = TrafficPoller()
+live_stream_slots = threading.BoundedSemaphore(LIVE_MAX_STREAMS)
+
+def get_traffic_snapshot() -> TrafficSnapshot:
+    """
+    Main function to read the latest live traffic snapshot
+    """
+    return traffic_poller.snapshot()
@@ -0,0 +1,183 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, Optional
+import google.generativeai as genai
+from dotenv import load_dotenv
+load_dotenv()
+
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "16"))
+GEMINI_QUEUE_TIMEOUT = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "20"))
+
+
+class LLMBusyError(Exception):
+    """
+    Raised when no LLM slot frees up before the queue deadline, or the queue is full
+    """
+
+
+class LLMClient:
+    """
+    Shared Gemini client for the whole process.
+
+    Holds one GenerativeModel, caps concurrent generations with a semaphore
+    (callers queue for up to ``queue_timeout`` seconds, at most ``max_queue``
+    of them), and coalesces concurrent requests with the same key into one
+    upstream call.
+    """
+
+    def __init__(self, model_name: str = GEMINI_MODEL, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 max_queue: int = GEMINI_MAX_QUEUE, queue_timeout: float = GEMINI_QUEUE_TIMEOUT):
+        self.model_name = model_name
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._model = None
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight: Dict[Hashable, Future] = {}
+        # One thread per possible queued caller, so async waiters never wait
+        # for a thread, and never hold the event loop's default executor
+        self._slot_waiters = ThreadPoolExecutor(max_workers=max_queue, thread_name_prefix="llm-slot")
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def _enqueue(self) -> None:
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise LLMBusyError("Too many insight requests are queued, please retry shortly")
+            self._waiting += 1
+
+    def _dequeue(self) -> None:
+        with self._lock:
+            self._waiting -= 1
+
+    def _acquire(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for a slot as a queued caller (see _enqueue)
+        """
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout if timeout is None else timeout)
+        finally:
+            self._dequeue()
+        if not acquired:
+            raise LLMBusyError("Timed out waiting for a free insight generation slot")
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Hold one of the concurrency slots for the duration of the block
+        """
+        self._enqueue()
+        self._acquire(timeout)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _release_abandoned(self, waiter: Future) -> None:
+        # The coroutine waiting on ``waiter`` was cancelled
+        if waiter.cancelled():
+            self._dequeue()
+        elif waiter.exception() is None:
+            self._slots.release()
+
+    async def _acquire_async(self) -> None:
+        """
+        Wait for a slot without blocking the event loop. If the caller is
+        cancelled, a slot acquired after that is released again.
+        """
+        self._enqueue()
+        waiter = self._slot_waiters.submit(self._acquire)
+        try:
+            await asyncio.wrap_future(waiter)
+        except asyncio.CancelledError:
+            waiter.add_done_callback(self._release_abandoned)
+            raise
+
+    def generate(self, prompt: str, key: Optional[Hashable] = None) -> str:
+        """
+        Generate text for ``prompt``. Concurrent calls with the same ``key``
+        share the first caller's result instead of making their own call.
+        """
+        if key is None:
+            with self.slot():
+                return self.model.generate_content(prompt).text
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            with self.slot():
+                text = self.model.generate_content(prompt).text
+            future.set_result(text)
+            return text
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    async def generate_async(self, prompt: str, key: Optional[Hashable] = None) -> str:
+        """
+        generate() for coroutines: the Gemini call is awaited instead of
+        blocking a thread. Shares slots, queue limit and coalescing with
+        the sync path.
+        """
+        if key is not None:
+            with self._lock:
+                future = self._in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._in_flight[key] = Future()
+            if not leader:
+                return await asyncio.wrap_future(future)
+
+        try:
+            await self._acquire_async()
+            try:
+                text = (await self.model.generate_content_async(prompt)).text
+            finally:
+                self._slots.release()
+            if key is not None:
+                future.set_result(text)
+            return text
+        except BaseException as e:
+            if key is not None:
+                future.set_exception(e)
+            raise
+        finally:
+            if key is not None:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Yield text chunks as they are generated, holding a slot until the stream ends or is closed
+        """
+        with self.slot():
+            for chunk in self.model.generate_content(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
+
+
+llm_client = LLMClient()
@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_DISABLED = nullcontext()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic count per label set
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), enabled: bool = METRICS_ENABLED):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.enabled = enabled
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Gauge:
+    """
+    Last set value per label set
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), enabled: bool = METRICS_ENABLED):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.enabled = enabled
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labels: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram per label set, in seconds
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, enabled: bool = METRICS_ENABLED):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labels: str) -> ContextManager:
+        """
+        Context manager observing the duration of its block
+        """
+        if not self.enabled:
+            return _DISABLED
+        return self._timer(labels)
+
+    @contextmanager
+    def _timer(self, labels: Tuple[str, ...]) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "airinsights_stage_seconds",
+    "Time spent in each hot-path stage (upstream fetch, parse, filter, aggregate, serialize)",
+    ("stage",)
+)
+REQUEST_SECONDS = Histogram("airinsights_request_seconds", "Request handling time by endpoint", ("endpoint", "status"))
+CACHE_REQUESTS = Counter("airinsights_cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+UPSTREAM_ERRORS = Counter("airinsights_upstream_errors_total", "Failed upstream requests by source", ("source",))
+UPSTREAM_RATE_LIMITED = Counter("airinsights_upstream_rate_limited_total", "Upstream 429 responses by source", ("source",))
+UPSTREAM_SHORT_CIRCUITED = Counter(
+    "airinsights_upstream_short_circuited_total", "Upstream calls skipped by an open circuit breaker", ("source",)
+)
+CIRCUIT_STATE = Gauge("airinsights_circuit_state", "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)", ("source",))
+
+REGISTRY = (
+    STAGE_SECONDS, REQUEST_SECONDS, CACHE_REQUESTS, UPSTREAM_ERRORS, UPSTREAM_RATE_LIMITED,
+    UPSTREAM_SHORT_CIRCUITED, CIRCUIT_STATE
+)
+
+
+def timed(stage: str) -> ContextManager:
+    """
+    Time a block as ``stage``; a shared no-op when metrics are disabled
+    """
+    return STAGE_SECONDS.time(stage)
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
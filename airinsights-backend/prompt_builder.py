@@ -0,0 +1,143 @@
+import json
+import os
+import statistics
+from collections import Counter
+from typing import Dict, List, Tuple
+from analytics import FlightAggregates
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("GEMINI_PROMPT_TOKEN_BUDGET", "1500"))
+
+# Rough chars-per-token ratio for English/tabular text, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+DISRUPTED_STATUSES = ("cancelled", "diverted", "incident")
+
+INSTRUCTIONS = """Generate insights including:
+- Most common routes
+- Time patterns (peak hours or days)
+- Status trends (delayed, scheduled, etc.)
+- Anomalies or demand spikes
+
+Keep it short and business-friendly."""
+
+
+def _split_records(flight_data) -> Tuple[List[Dict], List[Dict], List]:
+    """
+    Separate AviationStack schedule rows, live aircraft rows and anything else
+    """
+    records = flight_data if isinstance(flight_data, list) else [flight_data]
+    scheduled, live, other = [], [], []
+    for record in records:
+        if isinstance(record, dict) and ("departure_airport" in record or "arrival_airport" in record):
+            scheduled.append(record)
+        elif isinstance(record, dict) and "icao24" in record:
+            live.append(record)
+        else:
+            other.append(record)
+    return scheduled, live, other
+
+
+def _table(title: str, rows: List[Tuple]) -> List[str]:
+    return [f"{title}:"] + [" | ".join(str(v) for v in row) for row in rows]
+
+
+def _spikes(counts: Dict, factor: float = 2.0) -> List[Tuple]:
+    """
+    Keys whose count is more than ``factor`` standard deviations above the mean
+    """
+    values = list(counts.values())
+    if len(values) < 3:
+        return []
+    mean = statistics.fmean(values)
+    spread = statistics.pstdev(values)
+    if not spread:
+        return []
+    return [(key, count) for key, count in counts.items() if count > mean + factor * spread]
+
+
+def summarize_scheduled(flights: List[Dict], top_n: int) -> List[List[str]]:
+    aggregates = FlightAggregates().add_batch(flights)
+    hourly = {f"{hour:02d}:00": count for hour, count in enumerate(aggregates.departures.hours) if count}
+
+    anomalies = [f"Departure spike at {hour}: {count} flights" for hour, count in _spikes(hourly)]
+    anomalies += [f"Route demand spike {route}: {count} flights" for route, count in _spikes(aggregates.routes)[:top_n]]
+    anomalies += [f"{aggregates.statuses[status]} flights {status}" for status in DISRUPTED_STATUSES if aggregates.statuses[status]]
+
+    # Ordered by priority: later sections are the first to go when the budget is tight
+    return [
+        [f"Scheduled flights analysed: {aggregates.total}, unique routes: {len(aggregates.routes)}"],
+        _table("Flight status (status | flights)", aggregates.statuses.most_common()),
+        ["Anomalies:"] + anomalies if anomalies else [],
+        _table("Top routes (route | flights | airlines)",
+               [(route, count, len(aggregates.route_airlines[route])) for route, count in aggregates.routes.most_common(top_n)]),
+        _table("Departures by hour (hour | flights)", list(hourly.items())),
+        _table("Top airlines (airline | flights)", aggregates.airlines.most_common(top_n)),
+        _table("Busiest airports (airport | departures+arrivals)",
+               [(aggregates.airport_short_names.get(airport, airport), count)
+                for airport, count in aggregates.all_airports.most_common(top_n)]),
+    ]
+
+
+def summarize_live(aircraft: List[Dict], top_n: int) -> List[List[str]]:
+    airborne = [a for a in aircraft if not a.get("on_ground")]
+    speeds = [a["velocity_kmh"] for a in airborne if isinstance(a.get("velocity_kmh"), (int, float))]
+    altitudes = [a["altitude"] for a in airborne if isinstance(a.get("altitude"), (int, float))]
+    countries = Counter(a.get("origin_country") or "Unknown" for a in aircraft)
+    # The first three callsign letters are the operator's ICAO code
+    operators = Counter(a["callsign"][:3] for a in aircraft if isinstance(a.get("callsign"), str) and len(a["callsign"]) > 3)
+
+    overview = [f"Live aircraft tracked: {len(aircraft)}, airborne: {len(airborne)}, on ground: {len(aircraft) - len(airborne)}"]
+    if speeds:
+        overview.append(f"Median airborne speed: {statistics.median(speeds):.0f} km/h")
+    if altitudes:
+        overview.append(f"Median airborne altitude: {statistics.median(altitudes):.0f}")
+    return [
+        overview,
+        _table("Aircraft by origin country (country | aircraft)", countries.most_common(top_n)),
+        _table("Top operators by callsign prefix (prefix | aircraft)", operators.most_common(top_n)),
+    ]
+
+
+def _fit(header: str, sections: List[List[str]], budget_chars: int) -> str:
+    """
+    Add section lines in priority order until the character budget is used up
+    """
+    lines = []
+    used = len(header)
+    for section in sections:
+        if not section:
+            continue
+        for i, line in enumerate(section):
+            if used + len(line) + 1 > budget_chars:
+                # Drop a section title whose rows would not fit
+                if i == 1 and lines:
+                    lines.pop()
+                return "\n".join(lines)
+            lines.append(line)
+            used += len(line) + 1
+        lines.append("")
+        used += 1
+    return "\n".join(lines)
+
+
+def build_insights_prompt(flight_data, token_budget: int = PROMPT_TOKEN_BUDGET, top_n: int = 10) -> str:
+    """
+    Prompt built from summary tables of the dataset instead of its raw repr,
+    so prompt size stays within ``token_budget`` whatever the input size.
+    """
+    scheduled, live, other = _split_records(flight_data)
+    sections = []
+    if scheduled:
+        sections += summarize_scheduled(scheduled, top_n)
+    if live:
+        sections += summarize_live(live, top_n)
+
+    header = "You are a data analyst for an airline company.\n\nHere is a summary of the flight dataset:\n"
+    footer = "\n" + INSTRUCTIONS
+    budget_chars = max(0, token_budget * CHARS_PER_TOKEN - len(footer))
+
+    if other:
+        raw = json.dumps(other, separators=(",", ":"), default=str)
+        sections.append(["Other data (may be truncated):", raw[:budget_chars // 2]])
+    body = _fit(header, sections, budget_chars)
+    return f"{header}{body}\n{footer}"
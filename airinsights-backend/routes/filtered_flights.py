@@ -1,7 +1,13 @@
 from flask import Blueprint, request, jsonify
-from flight_scraper import get_scraped_flights
+from live_traffic import get_traffic_snapshot
+from flight_filters import FlightFilter
+from flight_history import HISTORY_RETENTION_HOURS, get_flight_history
+from json_backend import cached_json_response
+from metrics import timed
+from spatial_index import GridIndex, SpatialQuery
 from dateutil.parser import isoparse
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import math
 import re
 
 filter_bp = Blueprint('filter', __name__)
@@ -66,6 +72,130 @@ def validate_date_range(start, end):
     except ValueError as e:
         return None, f"Invalid date format: {str(e)}"
 
+def validate_range(name, low, high, errors, non_negative=False):
+    """Validate an optional numeric min/max pair"""
+    try:
+        low_val = float(low) if low else None
+        high_val = float(high) if high else None
+    except ValueError:
+        errors.append(f"{name.replace('_', ' ').capitalize()} parameters must be valid numbers")
+        return None, None
+
+    if non_negative:
+        if low_val is not None and low_val < 0:
+            errors.append(f"min_{name} must be non-negative")
+        if high_val is not None and high_val < 0:
+            errors.append(f"max_{name} must be non-negative")
+    if low_val is not None and high_val is not None and low_val > high_val:
+        errors.append(f"min_{name} must be less than or equal to max_{name}")
+    return low_val, high_val
+
+def validate_spatial_params(args, errors):
+    """Validate viewport parameters (bounds, or lat/lon with radius_km and/or nearest)"""
+    bounds = args.get('bounds', '').strip()
+    lat = args.get('lat', '').strip()
+    lon = args.get('lon', '').strip()
+    radius_km = args.get('radius_km', '').strip()
+    nearest = args.get('nearest', '').strip()
+
+    if not (bounds or lat or lon or radius_km or nearest):
+        return None
+
+    if bounds:
+        if lat or lon or radius_km or nearest:
+            errors.append("bounds cannot be combined with lat/lon, radius_km or nearest")
+            return None
+        try:
+            min_lat, max_lat, min_lon, max_lon = [float(v) for v in bounds.split(',')]
+        except ValueError:
+            errors.append("bounds must be 'min_lat,max_lat,min_lon,max_lon'")
+            return None
+        if not all(map(math.isfinite, (min_lat, max_lat, min_lon, max_lon))):
+            errors.append("bounds must be finite numbers")
+            return None
+        if not (-90 <= min_lat <= max_lat <= 90):
+            errors.append("bounds latitudes must satisfy -90 <= min_lat <= max_lat <= 90")
+        if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+            errors.append("bounds longitudes must be between -180 and 180")
+        return SpatialQuery(bounds=(min_lat, max_lat, min_lon, max_lon))
+
+    if not (lat and lon):
+        errors.append("lat and lon are required for radius_km or nearest queries")
+        return None
+    if not (radius_km or nearest):
+        errors.append("lat/lon queries need radius_km and/or nearest")
+        return None
+
+    try:
+        lat_val = float(lat)
+        lon_val = float(lon)
+        if not (math.isfinite(lat_val) and math.isfinite(lon_val)):
+            raise ValueError(lat)
+        if not (-90 <= lat_val <= 90) or not (-180 <= lon_val <= 180):
+            errors.append("lat must be between -90 and 90 and lon between -180 and 180")
+    except ValueError:
+        errors.append("lat and lon must be valid numbers")
+        return None
+
+    radius_val = None
+    if radius_km:
+        try:
+            radius_val = float(radius_km)
+            if not math.isfinite(radius_val):
+                raise ValueError(radius_km)
+            if radius_val <= 0:
+                errors.append("radius_km must be positive")
+        except ValueError:
+            errors.append("radius_km must be a valid number")
+
+    nearest_val = None
+    if nearest:
+        try:
+            nearest_val = int(nearest)
+            if nearest_val < 1 or nearest_val > 1000:
+                errors.append("nearest must be between 1 and 1000")
+        except ValueError:
+            errors.append("nearest must be a valid integer")
+
+    return SpatialQuery(center=(lat_val, lon_val), radius_km=radius_val, nearest=nearest_val)
+
+def validate_filter_params(args, errors):
+    """Validate the aircraft attribute filters shared by /flights/filter and /flights/live"""
+    country = args.get('country', '').strip()
+    on_ground = args.get('on_ground', '').strip()
+    callsign = args.get('callsign', '').strip()
+
+    normalized_country = validate_country_code(country) if country else None
+
+    on_ground_val = None
+    if on_ground:
+        if on_ground.lower() not in ['true', 'false']:
+            errors.append("on_ground parameter must be 'true' or 'false'")
+        else:
+            on_ground_val = on_ground.lower() == 'true'
+
+    min_speed_val, max_speed_val = validate_range("speed", args.get('min_speed', '').strip(), args.get('max_speed', '').strip(), errors, non_negative=True)
+    min_altitude_val, max_altitude_val = validate_range("altitude", args.get('min_altitude', '').strip(), args.get('max_altitude', '').strip(), errors)
+    min_vertical_rate_val, max_vertical_rate_val = validate_range("vertical_rate", args.get('min_vertical_rate', '').strip(), args.get('max_vertical_rate', '').strip(), errors)
+
+    return FlightFilter(
+        country=normalized_country,
+        on_ground=on_ground_val,
+        min_speed=min_speed_val,
+        max_speed=max_speed_val,
+        min_altitude=min_altitude_val,
+        max_altitude=max_altitude_val,
+        min_vertical_rate=min_vertical_rate_val,
+        max_vertical_rate=max_vertical_rate_val,
+        callsign_prefix=callsign or None
+    )
+
+def to_epoch(dt):
+    """Epoch seconds for a parsed date, treating naive values as UTC"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
 @filter_bp.route('/flights/filter', methods=['GET'])
 def filter_flights():
     """
@@ -73,52 +203,38 @@ def filter_flights():
     
     Query Parameters:
     - country: Country name or code (e.g., 'Australia', 'AU', 'USA', 'US')
-    - start: Start date/time (ISO 8601 format) - Note: Limited functionality with real-time data
-    - end: End date/time (ISO 8601 format) - Note: Limited functionality with real-time data
+    - start: Start date/time (ISO 8601 format) - served from the position history
+    - end: End date/time (ISO 8601 format) - served from the position history (default: now)
     - on_ground: Filter by ground status ('true'/'false')
     - min_speed: Minimum velocity in km/h
     - max_speed: Maximum velocity in km/h
+    - min_altitude / max_altitude: Altitude band
+    - min_vertical_rate / max_vertical_rate: Climb (positive) or descent (negative) rate
+    - callsign: Callsign prefix (e.g., 'QFA')
+    - bounds: Viewport as 'min_lat,max_lat,min_lon,max_lon'
+    - lat, lon + radius_km: Aircraft within a radius of a point, nearest first
+    - lat, lon + nearest: The N nearest aircraft to a point (optionally capped by radius_km)
     - limit: Maximum number of results (default: 100, max: 1000)
     """
     try:
 
-        country = request.args.get('country', '').strip()
         start = request.args.get('start', '').strip()
         end = request.args.get('end', '').strip()
-        on_ground = request.args.get('on_ground', '').strip()
-        min_speed = request.args.get('min_speed', '').strip()
-        max_speed = request.args.get('max_speed', '').strip()
         limit = request.args.get('limit', '100').strip()
         
 
         errors = []
         
 
-        normalized_country = validate_country_code(country) if country else None
-        
-
         date_range, date_error = validate_date_range(start, end)
         if date_error:
             errors.append(date_error)
         
 
-        if on_ground and on_ground.lower() not in ['true', 'false']:
-            errors.append("on_ground parameter must be 'true' or 'false'")
+        flight_filter = validate_filter_params(request.args, errors)
         
 
-        min_speed_val = None
-        max_speed_val = None
-        try:
-            min_speed_val = float(min_speed) if min_speed else None
-            max_speed_val = float(max_speed) if max_speed else None
-            if min_speed_val is not None and min_speed_val < 0:
-                errors.append("min_speed must be non-negative")
-            if max_speed_val is not None and max_speed_val < 0:
-                errors.append("max_speed must be non-negative")
-            if min_speed_val is not None and max_speed_val is not None and min_speed_val > max_speed_val:
-                errors.append("min_speed must be less than or equal to max_speed")
-        except ValueError:
-            errors.append("Speed parameters must be valid numbers")
+        spatial_query = validate_spatial_params(request.args, errors)
         
 
         limit_val = 100
@@ -133,61 +249,77 @@ def filter_flights():
             return jsonify({"error": "Validation errors", "details": errors}), 400
         
 
-        on_ground_val = None
-        if on_ground:
-            on_ground_val = on_ground.lower() == 'true'
+        def build_response(flights, filtered, snapshot):
+            return {
+                "count": len(filtered),
+                "total_available": len(flights),
+                "filters_applied": {
+                    "country": flight_filter.country,
+                    "on_ground": flight_filter.on_ground,
+                    "min_speed": flight_filter.min_speed,
+                    "max_speed": flight_filter.max_speed,
+                    "min_altitude": flight_filter.min_altitude,
+                    "max_altitude": flight_filter.max_altitude,
+                    "min_vertical_rate": flight_filter.min_vertical_rate,
+                    "max_vertical_rate": flight_filter.max_vertical_rate,
+                    "callsign": flight_filter.callsign_prefix,
+                    "spatial": spatial_query._asdict() if spatial_query else None,
+                    "start": start if start else None,
+                    "end": end if end else None,
+                    "limit": limit_val
+                },
+                "flights": filtered,
+                "timestamp": datetime.utcnow().isoformat(),
+                "snapshot": {
+                    "version": snapshot.version,
+                    "timestamp": snapshot.timestamp
+                } if snapshot else None,
+                "data_source": "FlightRadar24 & OpenSky APIs",
+                "note": "Position history: last recorded state of each aircraft within start/end." if snapshot is None
+                        else "Real-time flight data from legitimate aviation APIs."
+            }
         
 
-        flights = get_scraped_flights()
-        filtered = []
-        
-        for flight in flights:
-    
-            
-    
-            if normalized_country:
-                flight_country = flight.get("origin_country", "")
-                if not flight_country or flight_country.lower() != normalized_country.lower():
-                    continue
-            
-    
-            if on_ground_val is not None and flight.get("on_ground") != on_ground_val:
-                continue
-            
-    
-            velocity = flight.get("velocity_kmh", 0)
-            if min_speed_val is not None and velocity < min_speed_val:
-                continue
-            if max_speed_val is not None and velocity > max_speed_val:
-                continue
-        
-            
-            filtered.append(flight)
-            
-    
-            if len(filtered) >= limit_val:
-                break
-        
+        if start or end:
+            flight_history = get_flight_history()
+            if flight_history is None:
+                return jsonify({"error": "Validation errors", "details": ["start/end need the position history (FLIGHT_HISTORY_DB)"]}), 400
 
-        response = {
-            "count": len(filtered),
-            "total_available": len(flights),
-            "filters_applied": {
-                "country": normalized_country if country else None,
-                "on_ground": on_ground_val if on_ground else None,
-                "min_speed": min_speed_val if min_speed else None,
-                "max_speed": max_speed_val if max_speed else None,
-                "start": start if start else None,
-                "end": end if end else None,
-                "limit": limit_val
-            },
-            "flights": filtered,
-            "timestamp": datetime.utcnow().isoformat(),
-            "data_source": "FlightRadar24 & OpenSky APIs",
-            "note": "Real-time flight data from legitimate aviation APIs. Time filtering is limited with current data sources."
-        }
-        
-        return jsonify(response)
+            start_dt, end_dt = date_range
+            end_dt = end_dt or datetime.now(timezone.utc)
+            start_dt = start_dt or end_dt - timedelta(hours=HISTORY_RETENTION_HOURS)
+            with timed("history.query"):
+                flights, recorded_at = flight_history.latest_between(
+                    to_epoch(start_dt), to_epoch(end_dt),
+                    bounds=spatial_query.bounds if spatial_query else None
+                )
+            if spatial_query and spatial_query.bounds is None:
+                with timed("filter.select"):
+                    selected = GridIndex(flights).select(spatial_query)
+                flights, recorded_at = flights.take(selected), recorded_at[selected]
+
+            with timed("filter.apply"):
+                matches = flight_filter.apply(flights, limit=limit_val)
+            filtered = flights.to_rows(matches)
+            # Each historical row keeps the time it was recorded
+            for row, ts in zip(filtered, recorded_at[matches].tolist()):
+                row["timestamp"] = datetime.utcfromtimestamp(ts).isoformat()
+            return jsonify(build_response(flights, filtered, None))
+
+        snapshot = get_traffic_snapshot()
+
+        def build_live_response():
+            with timed("filter.select"):
+                flights = snapshot.select(spatial_query)
+            with timed("filter.apply"):
+                filtered = flights.to_rows(flight_filter.apply(flights, limit=limit_val))
+            return build_response(flights, filtered, snapshot)
+
+        # Identical live queries against the same snapshot reuse the encoded body
+        return cached_json_response(
+            ("filter", snapshot.version, flight_filter.key(), spatial_query, limit_val),
+            build_live_response
+        )
         
     except Exception as e:
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
@@ -1,7 +1,7 @@
 
 from flask import Blueprint, jsonify
-from aviation import get_flight_data
-from collections import Counter
+from analytics import get_flight_aggregates
+from http_cache import conditional_json_response
 from datetime import datetime
 from utils import clean_airport_name
 
@@ -11,58 +11,30 @@ analytics_bp = Blueprint('analytics', __name__)
 def flight_analytics():
     try:
     
-        flights = get_flight_data(limit=100)
+        aggregates = get_flight_aggregates()
         
     
-        if not flights:
+        if not aggregates.total:
             return jsonify({
                 "error": "No real-time flight data available from AviationStack API",
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             }), 503
         
-        origin_countries = []
-        dest_countries = []
-        origin_airports = []
-        dest_airports = []
-        scheduled = 0
-        active = 0
-
-        for flight in flights:
-        
-            dep_airport = flight.get("departure_airport", "Unknown")
-            arr_airport = flight.get("arrival_airport", "Unknown")
-            
-            origin_airports.append(clean_airport_name(dep_airport))
-            dest_airports.append(clean_airport_name(arr_airport))
-            
-        
-            origin_country = dep_airport.split()[-1] if dep_airport != "Unknown" else "Unknown"
-            dest_country = arr_airport.split()[-1] if arr_airport != "Unknown" else "Unknown"
-            
-            origin_countries.append(origin_country)
-            dest_countries.append(dest_country)
-            
-        
-            status = flight.get("status", "scheduled")
-            if status == "active":
-                active += 1
-            else:
-                scheduled += 1
-
-        response = {
-            "top_origin_airports": Counter(origin_airports).most_common(5),
-            "top_destination_airports": Counter(dest_airports).most_common(5),
-            "top_origin_countries": Counter(origin_countries).most_common(5),
-            "top_destination_countries": Counter(dest_countries).most_common(5),
-            "status_distribution": {
-                "active": active,
-                "scheduled": scheduled
-            },
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-            "data_source": "AviationStack API"
-        }
+        def build_analytics():
+            return {
+                "top_origin_airports": aggregates.origin_airports.most_common(5),
+                "top_destination_airports": aggregates.dest_airports.most_common(5),
+                "top_origin_countries": aggregates.origin_countries.most_common(5),
+                "top_destination_countries": aggregates.dest_countries.most_common(5),
+                "status_distribution": {
+                    "active": aggregates.active,
+                    "scheduled": aggregates.scheduled
+                },
+                "timestamp": datetime.utcfromtimestamp(aggregates.fetched_at).isoformat() + "Z",
+                "data_source": "AviationStack API"
+            }
 
-        return jsonify(response)
+        return conditional_json_response(("analytics",), (aggregates.version, aggregates.fetched_at), build_analytics)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -76,149 +48,101 @@ def trend_analytics():
     """
     try:
     
-        flights = get_flight_data(limit=100)
+        aggregates = get_flight_aggregates()
         
     
-        if not flights:
+        if not aggregates.total:
             return jsonify({
                 "error": "No real-time flight data available from AviationStack API",
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             }), 503
         
-
-        
-    
-        routes = []
-        airlines = []
-        departure_airports = []
-        arrival_airports = []
-        
-        for flight in flights:
-            if flight.get('departure_airport') and flight.get('arrival_airport'):
-            
-                dep_airport = flight['departure_airport']
-                arr_airport = flight['arrival_airport']
-                
-            
-                dep_short = clean_airport_name(dep_airport)
-                arr_short = clean_airport_name(arr_airport)
-                route = f"{dep_short} → {arr_short}"
-                
-                routes.append(route)
-                airlines.append(flight.get('airline', 'Unknown'))
-                departure_airports.append(dep_airport) 
-                arrival_airports.append(arr_airport)   
-        
-    
-        route_counts = Counter(routes)
-        popular_routes = [
-            {
-                "route": route,
-                "frequency": count,
-                "demand_level": "High" if count >= 5 else "Medium" if count >= 3 else "Low"
-            }
-            for route, count in route_counts.most_common(10)
-        ]
-        
-    
-        departure_counts = Counter(departure_airports)
-        arrival_counts = Counter(arrival_airports)
-        
     
-        all_airports = departure_counts + arrival_counts
-        
-
-        
-        high_demand_locations = [
-            {
-                "airport": clean_airport_name(airport),
-                "total_flights": count,
-                "departures": departure_counts.get(airport, 0),
-                "arrivals": arrival_counts.get(airport, 0),
-                "demand_category": "Very High" if count >= 15 else "High" if count >= 10 else "Medium" if count >= 5 else "Low"
-            }
-            for airport, count in all_airports.most_common(15)
-        ]
-        
-    
-        airline_counts = Counter(airlines)
-        competitive_routes = []
-        
-        for route, count in route_counts.items():
-            if count >= 3: 
-                route_airlines = [flight.get('airline', 'Unknown') for flight in flights 
-                                if f"{flight.get('departure_airport')} → {flight.get('arrival_airport')}" == route]
-                unique_airlines = len(set(route_airlines))
-                
-                competitive_routes.append({
+        def build_trends():
+            route_counts = aggregates.routes
+            popular_routes = [
+                {
                     "route": route,
-                    "flight_frequency": count,
-                    "airline_competition": unique_airlines,
-                    "price_pressure": "High" if unique_airlines >= 3 else "Medium" if unique_airlines >= 2 else "Low"
-                })
+                    "frequency": count,
+                    "demand_level": "High" if count >= 5 else "Medium" if count >= 3 else "Low"
+                }
+                for route, count in route_counts.most_common(10)
+            ]
         
     
-        competitive_routes.sort(key=lambda x: x['airline_competition'], reverse=True)
+            departure_counts = aggregates.departure_airports
+            arrival_counts = aggregates.arrival_airports
+            all_airports = aggregates.all_airports
+        
+            high_demand_locations = [
+                {
+                    "airport": aggregates.airport_short_names.get(airport) or clean_airport_name(airport),
+                    "total_flights": count,
+                    "departures": departure_counts.get(airport, 0),
+                    "arrivals": arrival_counts.get(airport, 0),
+                    "demand_category": "Very High" if count >= 15 else "High" if count >= 10 else "Medium" if count >= 5 else "Low"
+                }
+                for airport, count in all_airports.most_common(15)
+            ]
         
     
-        top_airlines = [
-            {
-                "airline": airline,
-                "flight_count": count,
-                "market_share": round((count / len(flights)) * 100, 2)
-            }
-            for airline, count in airline_counts.most_common(10)
-        ]
+            airline_counts = aggregates.airlines
+            competitive_routes = []
         
-    
-        time_distribution = {}
-        for flight in flights:
-            if flight.get('departure_time'):
-                try:
+            for route, count in route_counts.items():
+                if count >= 3: 
+                    unique_airlines = len(aggregates.route_airlines[route])
                 
-                    if isinstance(flight['departure_time'], str):
-                    
-                        departure_dt = datetime.fromisoformat(flight['departure_time'].replace('Z', '+00:00'))
-                    else:
-                    
-                        departure_dt = datetime.fromtimestamp(flight['departure_time'] / 1000)
-                    
-                    departure_hour = departure_dt.hour
-                    time_slot = f"{departure_hour:02d}:00-{(departure_hour+1)%24:02d}:00"
-                    time_distribution[time_slot] = time_distribution.get(time_slot, 0) + 1
-                except Exception as e:
-                    print(f"Error processing departure time: {e}")
-                    continue
+                    competitive_routes.append({
+                        "route": route,
+                        "flight_frequency": count,
+                        "airline_competition": unique_airlines,
+                        "price_pressure": "High" if unique_airlines >= 3 else "Medium" if unique_airlines >= 2 else "Low"
+                    })
         
     
-        peak_hours = sorted(time_distribution.items(), key=lambda x: int(x[0][:2]))
+            competitive_routes.sort(key=lambda x: x['airline_competition'], reverse=True)
         
-        response = {
-            "popular_routes": {
-                "top_routes": popular_routes,
-                "total_unique_routes": len(route_counts)
-            },
-            "high_demand_locations": {
-                "airports": high_demand_locations,
-                "total_airports": len(all_airports)
-            },
-            "price_trends": {
-                "competitive_routes": competitive_routes[:10],
-                "top_airlines": top_airlines,
-                "market_insights": {
-                    "total_flights_analyzed": len(flights),
-                    "average_competition_per_route": round(sum(r['airline_competition'] for r in competitive_routes) / len(competitive_routes), 2) if competitive_routes else 0
+    
+            top_airlines = [
+                {
+                    "airline": airline,
+                    "flight_count": count,
+                    "market_share": round((count / aggregates.total) * 100, 2)
                 }
-            },
-            "time_analysis": {
-                "peak_departure_hours": [{"time_slot": slot, "flight_count": count} for slot, count in peak_hours],
-                "total_time_slots_analyzed": len(time_distribution)
-            },
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-            "data_source": "AviationStack API"
-        }
+                for airline, count in airline_counts.most_common(10)
+            ]
         
-        return jsonify(response)
+    
+            peak_hours = aggregates.departures.slots()
+        
+            return {
+                "popular_routes": {
+                    "top_routes": popular_routes,
+                    "total_unique_routes": len(route_counts)
+                },
+                "high_demand_locations": {
+                    "airports": high_demand_locations,
+                    "total_airports": len(all_airports)
+                },
+                "price_trends": {
+                    "competitive_routes": competitive_routes[:10],
+                    "top_airlines": top_airlines,
+                    "market_insights": {
+                        "total_flights_analyzed": aggregates.total,
+                        "average_competition_per_route": round(sum(r['airline_competition'] for r in competitive_routes) / len(competitive_routes), 2) if competitive_routes else 0
+                    }
+                },
+                "time_analysis": {
+                    "peak_departure_hours": [{"time_slot": slot, "flight_count": count} for slot, count in peak_hours],
+                    "total_time_slots_analyzed": len(peak_hours),
+                    "departures_by_weekday": [{"day": day, "flight_count": count} for day, count in aggregates.departures.weekday_totals()]
+                },
+                "timestamp": datetime.utcfromtimestamp(aggregates.fetched_at).isoformat() + "Z",
+                "data_source": "AviationStack API"
+            }
+
+        return conditional_json_response(("trends",), (aggregates.version, aggregates.fetched_at), build_trends)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
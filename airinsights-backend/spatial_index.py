@@ -0,0 +1,192 @@
+import math
+import os
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+from flight_state import FlightStateTable
+
+CELL_SIZE_DEG = float(os.getenv("SPATIAL_CELL_SIZE_DEG", "1.0"))
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.195
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distance in km from one point to arrays of points
+    """
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons - lon)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def cell_ids(lat: np.ndarray, lon: np.ndarray, cell_size: float = CELL_SIZE_DEG) -> np.ndarray:
+    """
+    Grid cell id of each point, numbered row-major from (-90, -180)
+    """
+    n_rows = int(math.ceil(180.0 / cell_size))
+    n_cols = int(math.ceil(360.0 / cell_size))
+    rows = np.clip(np.floor((np.asarray(lat) + 90.0) / cell_size), 0, n_rows - 1).astype(np.int64)
+    cols = np.clip(np.floor((np.asarray(lon) + 180.0) / cell_size), 0, n_cols - 1).astype(np.int64)
+    return rows * n_cols + cols
+
+
+def cells_overlapping(bounds: tuple, cell_size: float = CELL_SIZE_DEG) -> List[int]:
+    """
+    Ids of every cell touching (min_lat, max_lat, min_lon, max_lon)
+    """
+    min_lat, max_lat, min_lon, max_lon = bounds
+    n_cols = int(math.ceil(360.0 / cell_size))
+    first_row, last_row = (cell_ids([max(min_lat, -90.0), min(max_lat, 90.0)], [-180.0, -180.0], cell_size) // n_cols).tolist()
+    cells = []
+    for lo, hi in GridIndex._lon_spans(min_lon, max_lon):
+        first_col, last_col = cell_ids([-90.0, -90.0], [lo, hi], cell_size).tolist()
+        for row in range(first_row, last_row + 1):
+            cells.extend(range(row * n_cols + first_col, row * n_cols + last_col + 1))
+    return cells
+
+
+class SpatialQuery(NamedTuple):
+    """
+    Viewport selection: a bounding box, a radius around a point, or the N nearest aircraft
+    """
+    bounds: Optional[Tuple[float, float, float, float]] = None
+    center: Optional[Tuple[float, float]] = None
+    radius_km: Optional[float] = None
+    nearest: Optional[int] = None
+
+    def mask(self, table: FlightStateTable) -> np.ndarray:
+        """
+        Boolean mask over ``table`` for bounds/radius queries, without an index.
+        Nearest-N depends on the whole fleet, so it has no per-row mask.
+        """
+        if self.nearest is not None:
+            raise ValueError("nearest queries cannot be evaluated row by row")
+        lat = table.numeric["latitude"]
+        lon = table.numeric["longitude"]
+        if self.center is not None:
+            return haversine_km(self.center[0], self.center[1], lat, lon) <= self.radius_km
+        min_lat, max_lat, min_lon, max_lon = self.bounds
+        inside = (lat >= min_lat) & (lat <= max_lat)
+        if min_lon <= max_lon:
+            return inside & (lon >= min_lon) & (lon <= max_lon)
+        return inside & ((lon >= min_lon) | (lon <= max_lon))
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid over a FlightStateTable.
+
+    Rows are bucketed by cell and stored sorted by cell id, so a query only
+    touches the cells it overlaps and costs roughly O(hits) instead of a
+    scan over every aircraft. Built once per snapshot.
+    """
+
+    def __init__(self, table: FlightStateTable, cell_size: float = CELL_SIZE_DEG):
+        self.table = table
+        self.cell_size = cell_size
+        self.n_rows = int(math.ceil(180.0 / cell_size))
+        self.n_cols = int(math.ceil(360.0 / cell_size))
+
+        lat = table.numeric["latitude"]
+        lon = table.numeric["longitude"]
+        rows = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+        cells = cell_ids(lat[rows], lon[rows], cell_size)
+        order = np.argsort(cells, kind="stable")
+        self._rows = rows[order]
+        self._cells = cells[order]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _candidates(self, min_lat: float, max_lat: float, lon_spans: List[Tuple[float, float]]) -> np.ndarray:
+        """
+        Table rows in every cell overlapping the box; may include rows just outside it
+        """
+        r0, r1 = (cell_ids([max(min_lat, -90.0), min(max_lat, 90.0)], [-180.0, -180.0], self.cell_size) // self.n_cols).tolist()
+        chunks = []
+        for min_lon, max_lon in lon_spans:
+            c0, c1 = cell_ids([-90.0, -90.0], [min_lon, max_lon], self.cell_size).tolist()
+            starts = np.arange(r0, r1 + 1) * self.n_cols + c0
+            lo = np.searchsorted(self._cells, starts, side="left")
+            hi = np.searchsorted(self._cells, starts + (c1 - c0), side="right")
+            chunks.extend(self._rows[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a)
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    @staticmethod
+    def _lon_spans(min_lon: float, max_lon: float) -> List[Tuple[float, float]]:
+        # A box with min_lon > max_lon crosses the antimeridian
+        if min_lon <= max_lon:
+            return [(max(min_lon, -180.0), min(max_lon, 180.0))]
+        return [(max(min_lon, -180.0), 180.0), (-180.0, min(max_lon, 180.0))]
+
+    def query_bounds(self, bounds: tuple) -> np.ndarray:
+        """
+        Rows inside (min_lat, max_lat, min_lon, max_lon), in table order
+        """
+        min_lat, max_lat, min_lon, max_lon = bounds
+        rows = self._candidates(min_lat, max_lat, self._lon_spans(min_lon, max_lon))
+        lat = self.table.numeric["latitude"][rows]
+        lon = self.table.numeric["longitude"][rows]
+        inside = (lat >= min_lat) & (lat <= max_lat)
+        if min_lon <= max_lon:
+            inside &= (lon >= min_lon) & (lon <= max_lon)
+        else:
+            inside &= (lon >= min_lon) | (lon <= max_lon)
+        return np.sort(rows[inside])
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows within ``radius_km`` of (lat, lon) and their distances, nearest first
+        """
+        dlat = radius_km / KM_PER_DEG_LAT
+        if lat - dlat <= -90.0 or lat + dlat >= 90.0:
+            # The circle contains a pole, so it spans every longitude
+            spans = [(-180.0, 180.0)]
+        else:
+            # Widest longitude extent of the circle, reached poleward of its centre;
+            # dlat / cos(lat) underestimates it and would miss candidate cells
+            angular = radius_km / EARTH_RADIUS_KM
+            dlon = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat)))))
+            spans = self._lon_spans(((lon - dlon + 180.0) % 360.0) - 180.0, ((lon + dlon + 180.0) % 360.0) - 180.0) \
+                if dlon < 90.0 else [(-180.0, 180.0)]
+        rows = self._candidates(lat - dlat, lat + dlat, spans)
+        distances = haversine_km(lat, lon, self.table.numeric["latitude"][rows], self.table.numeric["longitude"][rows])
+        inside = distances <= radius_km
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return rows[order], distances[order]
+
+    def nearest(self, lat: float, lon: float, n: int, max_radius_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Up to ``n`` rows closest to (lat, lon), nearest first.
+
+        Searches a growing radius; once it holds ``n`` aircraft, those are
+        guaranteed to be the nearest ones. The radius never exceeds half the
+        Earth's circumference, which already covers the whole globe.
+        """
+        limit = math.pi * EARTH_RADIUS_KM
+        if max_radius_km is not None and max_radius_km < limit:
+            limit = max_radius_km
+        radius = min(self.cell_size * KM_PER_DEG_LAT, limit)
+        while True:
+            rows, distances = self.query_radius(lat, lon, radius)
+            if len(rows) >= n or radius >= limit:
+                return rows[:n], distances[:n]
+            radius = min(radius * 2, limit)
+
+    def select(self, query: SpatialQuery) -> np.ndarray:
+        """
+        Row indices matching a SpatialQuery
+        """
+        if query.nearest is not None:
+            lat, lon = query.center
+            return self.nearest(lat, lon, query.nearest, query.radius_km)[0]
+        if query.center is not None:
+            lat, lon = query.center
+            return self.query_radius(lat, lon, query.radius_km)[0]
+        return self.query_bounds(query.bounds)
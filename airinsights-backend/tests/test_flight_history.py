@@ -0,0 +1,84 @@
+import pytest
+from flight_history import PositionHistory
+from flight_state import FlightStateManager, FlightStateTable
+
+
+def poll(icao24_positions):
+    return FlightStateTable.from_rows(
+        {"icao24": icao24, "latitude": lat, "longitude": lon}
+        for icao24, (lat, lon) in icao24_positions.items()
+    )
+
+
+@pytest.fixture
+def history(tmp_path):
+    return PositionHistory(str(tmp_path / "history.db"))
+
+
+def record_polls(history, polls, start=1000.0, interval=10.0):
+    state = FlightStateManager(stale_after=interval * 1.5)
+    for i, positions in enumerate(polls):
+        ts = start + i * interval
+        changes = state.merge(poll(positions), ts)
+        history.record(state.table, changes, ts)
+
+
+def test_stationary_aircraft_is_in_later_windows(history):
+    record_polls(history, [
+        {"parked": (51.47, -0.45), "moving": (51.0, 0.0)},
+        {"parked": (51.47, -0.45), "moving": (51.1, 0.1)},
+        {"parked": (51.47, -0.45), "moving": (51.2, 0.2)},
+    ])
+
+    table, recorded_at = history.latest_between(1010.0, 1020.0)
+    rows = {row["icao24"]: (row["latitude"], ts) for row, ts in zip(table.iter_rows(), recorded_at.tolist())}
+    assert sorted(rows) == ["moving", "parked"]
+    assert rows["moving"] == (51.2, 1020.0)
+    # Only recorded at the first poll, when it appeared
+    assert rows["parked"] == (51.47, 1000.0)
+
+    table, _ = history.latest_between(1010.0, 1020.0, bounds=(51.4, 51.5, -0.5, -0.4))
+    assert table.icao24.tolist() == ["parked"]
+
+
+def test_window_skips_aircraft_gone_before_it(history):
+    record_polls(history, [
+        {"parked": (51.47, -0.45), "gone": (40.0, 10.0)},
+        {"parked": (51.47, -0.45)},
+        {"parked": (51.47, -0.45)},
+        {"parked": (51.47, -0.45)},
+    ])
+
+    table, _ = history.latest_between(1030.0, 1030.0)
+    assert table.icao24.tolist() == ["parked"]
+    table, _ = history.latest_between(1000.0, 1000.0)
+    assert sorted(table.icao24.tolist()) == ["gone", "parked"]
+
+
+def test_window_ignores_rows_from_an_earlier_sighting(history):
+    record_polls(history, [
+        {"returning": (10.0, 10.0), "other": (0.0, 0.0)},
+        {"other": (0.0, 0.0)},
+        {"other": (0.0, 0.0)},
+        {"returning": (20.0, 20.0), "other": (0.0, 0.0)},
+    ])
+
+    table, _ = history.latest_between(1020.0, 1020.0)
+    assert table.icao24.tolist() == ["other"]
+    table, _ = history.latest_between(1030.0, 1030.0, bounds=(5.0, 25.0, 5.0, 25.0))
+    assert table.to_rows()[0]["latitude"] == 20.0
+    table, _ = history.latest_between(1030.0, 1030.0, bounds=(5.0, 15.0, 5.0, 15.0))
+    assert len(table) == 0
+
+
+def test_only_one_process_writes(tmp_path):
+    path = str(tmp_path / "history.db")
+    writer, other = PositionHistory(path), PositionHistory(path)
+    record_polls(writer, [{"parked": (51.47, -0.45)}, {"parked": (51.47, -0.45)}])
+
+    # A second worker polling the same traffic must not duplicate rows or close the writer's sightings
+    state = FlightStateManager(stale_after=15.0)
+    assert other.record(state.table, state.merge(poll({"parked": (51.47, -0.45)}), 1020.0), 1020.0) == 0
+    table, recorded_at = other.latest_between(1010.0, 1010.0)
+    assert table.icao24.tolist() == ["parked"]
+    assert recorded_at.tolist() == [1000.0]
@@ -0,0 +1,39 @@
+import asyncio
+import time
+import pytest
+from llm_client import LLMBusyError, LLMClient
+
+
+def test_cancelled_async_waiter_gives_its_slot_back():
+    client = LLMClient(max_concurrency=1, max_queue=2, queue_timeout=2)
+
+    async def cancel_while_queued():
+        waiter = asyncio.ensure_future(client._acquire_async())
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    with client.slot():
+        asyncio.run(cancel_while_queued())
+    # The waiter thread gets the slot once it is free and must hand it back
+    time.sleep(0.2)
+    assert client._waiting == 0
+    with client.slot(timeout=0.5):
+        pass
+
+
+def test_async_waiters_respect_the_queue_limit():
+    client = LLMClient(max_concurrency=1, max_queue=1, queue_timeout=0.2)
+
+    async def queue_two():
+        first = asyncio.ensure_future(client._acquire_async())
+        await asyncio.sleep(0.05)
+        with pytest.raises(LLMBusyError, match="queued"):
+            await client._acquire_async()
+        with pytest.raises(LLMBusyError, match="Timed out"):
+            await first
+
+    with client.slot():
+        asyncio.run(queue_two())
+    assert client._waiting == 0
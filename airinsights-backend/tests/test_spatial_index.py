@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from flight_state import FlightStateTable
+from spatial_index import GridIndex, SpatialQuery, haversine_km
+
+
+def random_fleet(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(-89.5, 89.5, n)
+    lons = rng.uniform(-180.0, 180.0, n)
+    table = FlightStateTable.from_rows(
+        {"icao24": f"{i:06x}", "latitude": lat, "longitude": lon}
+        for i, (lat, lon) in enumerate(zip(lats.tolist(), lons.tolist()))
+    )
+    return table, GridIndex(table)
+
+
+@pytest.fixture(scope="module")
+def fleet():
+    return random_fleet()
+
+
+def random_centres(count=300, seed=1):
+    rng = np.random.default_rng(seed)
+    return zip(rng.uniform(-85, 85, count).tolist(), rng.uniform(-180, 180, count).tolist(),
+               rng.uniform(10, 3000, count).tolist())
+
+
+def test_radius_matches_brute_force(fleet):
+    table, index = fleet
+    lat, lon = table.numeric["latitude"], table.numeric["longitude"]
+    for c_lat, c_lon, radius in list(random_centres()) + [(-72.0, 136.0, 1725.0), (60.0, 179.5, 900.0)]:
+        expected = np.flatnonzero(haversine_km(c_lat, c_lon, lat, lon) <= radius)
+        rows, distances = index.query_radius(c_lat, c_lon, radius)
+        assert np.array_equal(np.sort(rows), expected), (c_lat, c_lon, radius)
+        assert np.all(np.diff(distances) >= 0)
+
+
+def test_nearest_matches_brute_force(fleet):
+    table, index = fleet
+    lat, lon = table.numeric["latitude"], table.numeric["longitude"]
+    for c_lat, c_lon, _ in random_centres(100, seed=2):
+        expected = np.sort(haversine_km(c_lat, c_lon, lat, lon))[:25]
+        rows, distances = index.nearest(c_lat, c_lon, 25)
+        assert len(rows) == 25
+        assert np.allclose(distances, expected), (c_lat, c_lon)
+
+
+def test_bounds_matches_brute_force(fleet):
+    table, index = fleet
+    lat, lon = table.numeric["latitude"], table.numeric["longitude"]
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        min_lat, max_lat = np.sort(rng.uniform(-90, 90, 2)).tolist()
+        # min_lon > max_lon half the time: boxes crossing the antimeridian
+        min_lon, max_lon = rng.uniform(-180, 180, 2).tolist()
+        bounds = (min_lat, max_lat, min_lon, max_lon)
+        expected = np.flatnonzero(SpatialQuery(bounds=bounds).mask(table))
+        assert np.array_equal(index.query_bounds(bounds), expected), bounds
+
+
+def test_nearest_stops_at_the_whole_globe():
+    table = FlightStateTable.from_rows([{"icao24": "a", "latitude": 10.0, "longitude": 10.0}])
+    index = GridIndex(table)
+    for max_radius in (None, float("nan"), float("inf"), 1e9):
+        rows, _ = index.nearest(-30.0, 140.0, 10, max_radius)
+        assert rows.tolist() == [0]
+
+
+@pytest.mark.parametrize("args", [
+    {"lat": "-30", "lon": "140", "nearest": "10", "radius_km": "nan"},
+    {"lat": "-30", "lon": "140", "radius_km": "inf"},
+    {"lat": "nan", "lon": "140", "radius_km": "100"},
+    {"bounds": "nan,10,0,10"},
+])
+def test_non_finite_spatial_params_are_rejected(args):
+    from routes.filtered_flights import validate_spatial_params
+    errors = []
+    validate_spatial_params(args, errors)
+    assert errors
@@ -0,0 +1,71 @@
+from collections import Counter
+from analytics import FlightAggregates
+from aviation import _parse_flights
+from benchmarks.fixtures import aviationstack_flights
+from time_buckets import HourlyHistogram, departure_slot
+
+# 2025-01-15 is a Wednesday
+WEDNESDAY = 2 * 24
+
+
+def test_wall_clock_time_with_literal_utc_offset():
+    # AviationStack: a 09:00 departure from Sydney, sent as local time with +00:00
+    assert departure_slot("2025-01-15T09:00:00+00:00", "Australia/Sydney") == WEDNESDAY + 9
+    assert departure_slot("2025-01-15T09:00:00", "Australia/Sydney") == WEDNESDAY + 9
+
+
+def test_real_offsets_and_epochs_use_the_airport_zone():
+    # 22:00 UTC on the 14th is 09:00 on the 15th in Sydney (AEDT, +11)
+    assert departure_slot("2025-01-15T08:00:00+10:00", "Australia/Sydney") == WEDNESDAY + 9
+    assert departure_slot(1736892000000, "Australia/Sydney") == WEDNESDAY + 9
+
+
+def test_unparseable_times():
+    assert departure_slot(None) is None
+    assert departure_slot("not a time") is None
+
+
+def test_sydney_morning_departure_lands_in_its_wall_clock_slot():
+    flight = {
+        "departure": {"airport": "Kingsford Smith", "timezone": "Australia/Sydney", "iata": "SYD",
+                      "icao": "YSSY", "scheduled": "2025-01-15T09:00:00+00:00"},
+        "arrival": {"airport": "Tullamarine", "timezone": "Australia/Melbourne", "iata": "MEL",
+                    "icao": "YMML", "scheduled": "2025-01-15T10:35:00+00:00"},
+        "airline": {"name": "Qantas", "iata": "QF"},
+        "flight": {"iata": "QF409"},
+        "flight_status": "scheduled",
+    }
+    aggregates = FlightAggregates().add_batch(_parse_flights([flight]))
+    assert aggregates.departures.slots() == [("09:00-10:00", 1)]
+    assert dict(aggregates.departures.weekday_totals())["Wed"] == 1
+
+
+def test_fixture_peak_hours_match_wall_clock_hours():
+    flights = aviationstack_flights(500)
+    expected = Counter(int(f["departure"]["scheduled"][11:13]) for f in flights)
+
+    aggregates = FlightAggregates().add_batch(_parse_flights(flights))
+    assert dict(aggregates.departures.peak_hours()) == dict(expected)
+
+    # Flights without a pre-parsed slot are bucketed the same way
+    for flight in _parse_flights(flights):
+        del flight["departure_slot"]
+        aggregates.add(flight)
+    assert dict(aggregates.departures.peak_hours()) == {hour: 2 * count for hour, count in expected.items()}
+
+
+def test_histogram_buckets_by_weekday():
+    histogram = HourlyHistogram(by_weekday=True)
+    histogram.add(WEDNESDAY + 9)
+    histogram.add(6 * 24 + 23)
+    assert histogram.peak_hours() == [(9, 1), (23, 1)]
+    assert histogram.weekday_totals()[2] == ("Wed", 1)
+    assert histogram.weekday_totals()[6] == ("Sun", 1)
+
+
+def test_invalid_slots_from_clients_are_recomputed():
+    flight = {"departure_time": "2025-01-15T09:00:00+00:00", "departure_iata": "SYD"}
+    aggregates = FlightAggregates()
+    for slot in (200, -1, "9", 9.0, True, None):
+        aggregates.add(dict(flight, departure_slot=slot))
+    assert aggregates.departures.slots() == [("09:00-10:00", 6)]
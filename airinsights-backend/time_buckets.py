@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+HOURS_PER_WEEK = 7 * 24
+
+
+def departure_slot(value, zone_name: Optional[str] = None) -> Optional[int]:
+    """
+    Hour of the week (weekday * 24 + hour, from Monday 00:00) of a departure
+    time in the local time of the departure airport; None if unparseable.
+
+    AviationStack sends scheduled times as the airport's wall-clock time with
+    a literal +00:00 offset, so ISO strings without an offset, or with a zero
+    one, are bucketed on their own date and hour. Only a non-zero offset or
+    an epoch (millis) is a real instant, converted into ``zone_name``.
+    """
+    if not value:
+        return None
+    try:
+        if isinstance(value, str):
+            local = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            if local.utcoffset() not in (None, timedelta(0)):
+                local = local.astimezone(get_zone(zone_name))
+        else:
+            local = datetime.fromtimestamp(int(value) // 1000, get_zone(zone_name))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    return local.weekday() * 24 + local.hour
+
+
+@lru_cache(maxsize=512)
+def get_zone(name: Optional[str]) -> tzinfo:
+    """
+    ZoneInfo for an IANA name, falling back to UTC for missing or unknown zones
+    """
+    if not name:
+        return timezone.utc
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def slot_label(hour: int) -> str:
+    """
+    'HH:00-HH:00' label of a one-hour slot; the last slot is '23:00-00:00'
+    """
+    return f"{hour:02d}:00-{(hour + 1) % 24:02d}:00"
+
+
+class HourlyHistogram:
+    """
+    Departures per local hour of day (24 buckets) and, optionally, per
+    weekday and hour. Counts are updated one departure at a time, so
+    peak-hour queries only ever look at the 24 buckets.
+    """
+
+    def __init__(self, by_weekday: bool = False):
+        self.hours = [0] * 24
+        self.weekdays = [[0] * 24 for _ in range(7)] if by_weekday else None
+
+    def add(self, slot: int) -> None:
+        """
+        Count a departure in hour of the week ``slot`` (see departure_slot)
+        """
+        weekday, hour = divmod(slot, 24)
+        self.hours[hour] += 1
+        if self.weekdays is not None:
+            self.weekdays[weekday][hour] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.hours)
+
+    def peak_hours(self, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        (hour, count) pairs for hours with departures, busiest first (ties by hour)
+        """
+        hours = sorted(((hour, count) for hour, count in enumerate(self.hours) if count), key=lambda x: -x[1])
+        return hours[:limit] if limit is not None else hours
+
+    def slots(self) -> List[Tuple[str, int]]:
+        """
+        (slot label, count) for hours with departures, in hour order
+        """
+        return [(slot_label(hour), count) for hour, count in enumerate(self.hours) if count]
+
+    def weekday_totals(self) -> List[Tuple[str, int]]:
+        """
+        (weekday, count) from Monday to Sunday; empty without per-weekday buckets
+        """
+        if self.weekdays is None:
+            return []
+        return [(WEEKDAYS[day], sum(hours)) for day, hours in enumerate(self.weekdays)]
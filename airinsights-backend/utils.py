@@ -1,15 +1,102 @@
+import csv
+import os
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+
+AIRPORT_NAME_CACHE_SIZE = int(os.getenv("AIRPORT_NAME_CACHE_SIZE", "4096"))
+AIRPORTS_DATA_FILE = os.getenv(
+    "AIRPORTS_DATA_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.csv")
+)
+
+
+@lru_cache(maxsize=AIRPORT_NAME_CACHE_SIZE)
 def clean_airport_name(name):
     """
-    Clean and shorten airport names for better display
+    Clean and shorten airport names for better display.
+    Airport names are a small, repetitive vocabulary, so results are memoized.
     """
     if not name or name == "Unknown":
         return "Unknown"
     if 'International' in name:
         parts = name.split(' International')[0]
-        return parts.split()[-1] if len(parts.split()) > 1 else parts
     elif 'Airport' in name:
         parts = name.split(' Airport')[0]
-        return parts.split()[-1] if len(parts.split()) > 1 else parts
     else:
         words = name.split()
-        return ' '.join(words[:3]) if len(words) > 3 else name 
\ No newline at end of file
+        return ' '.join(words[:3]) if len(words) > 3 else name
+    words = parts.split()
+    return words[-1] if len(words) > 1 else parts
+
+
+class AirportInfo(NamedTuple):
+    iata: str
+    icao: str
+    name: str
+    short_name: str
+    country: str
+    timezone: str
+
+
+_airport_table: Optional[Dict[str, AirportInfo]] = None
+
+def load_airport_table(path: str = AIRPORTS_DATA_FILE) -> Dict[str, AirportInfo]:
+    """
+    Load the IATA/ICAO -> AirportInfo lookup table from a local CSV file.
+    The table is optional; a missing file gives an empty table.
+    """
+    table = {}
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                info = AirportInfo(**{field: (row.get(field) or '').strip() for field in AirportInfo._fields})
+                if info.iata:
+                    table[info.iata.upper()] = info
+                if info.icao:
+                    table[info.icao.upper()] = info
+    except FileNotFoundError:
+        print(f"Airport data file not found at {path}, falling back to name heuristics")
+    return table
+
+def get_airport_table() -> Dict[str, AirportInfo]:
+    global _airport_table
+    if _airport_table is None:
+        _airport_table = load_airport_table()
+    return _airport_table
+
+def lookup_airport(*codes) -> Optional[AirportInfo]:
+    """
+    First AirportInfo matching any of the given IATA/ICAO codes
+    """
+    table = get_airport_table()
+    for code in codes:
+        if code:
+            info = table.get(code.upper())
+            if info:
+                return info
+    return None
+
+def airport_short_name(name, *codes):
+    """
+    Short display name, from the lookup table when a code is known
+    """
+    info = lookup_airport(*codes)
+    return info.short_name if info else clean_airport_name(name)
+
+def airport_timezone(*codes, fallback=None):
+    """
+    IANA timezone of an airport from the lookup table, else ``fallback``
+    """
+    info = lookup_airport(*codes)
+    if info and info.timezone:
+        return info.timezone
+    return fallback
+
+def airport_country(*codes, fallback=None):
+    """
+    Country of an airport from the lookup table, else ``fallback`` or 'Unknown'
+    """
+    info = lookup_airport(*codes)
+    if info and info.country:
+        return info.country
+    return fallback or "Unknown"